@@ -0,0 +1,157 @@
+"""Mediciones de rendimiento de las rutas críticas del procesamiento.
+
+Uso: python benchmarks.py [filas]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import conciliacion
+import curvas
+import desembolsos
+import exportar
+
+
+def _medir(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def montos_sinteticos(filas, seed=0):
+    rng = np.random.default_rng(seed)
+    valores = rng.uniform(0, 50_000_000, filas).round(2)
+    montos = pd.Series([f"{v:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.') for v in valores], dtype=object)
+    # Algunos vacíos y valores mal formados, como en la hoja real
+    montos[rng.random(filas) < 0.01] = np.nan
+    montos[rng.random(filas) < 0.001] = "s/d"
+    return montos
+
+
+def bench_parse_amounts(filas=1_000_000):
+    montos = montos_sinteticos(filas)
+    esperado, t_apply = _medir(montos.apply, desembolsos.clean_and_convert_to_float)
+    # Texto como lo deja read_csv (object) y respaldado por Arrow
+    for tipo in ('object', 'string[pyarrow]'):
+        obtenido, t_vectorizado = _medir(desembolsos.parse_amounts, montos.astype(tipo))
+        pd.testing.assert_series_equal(obtenido, esperado.astype(float))
+        print(f"parse_amounts ({filas} filas, {tipo}): apply {t_apply:.3f} s, vectorizado {t_vectorizado:.3f} s, "
+              f"{t_apply / t_vectorizado:.1f}x")
+
+
+def cartera_sintetica(filas, operaciones=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"{pais}{i:04d}_1" for pais in ('AR', 'BO', 'BR', 'PY', 'UR') for i in range(operaciones // 5)])
+    responsables = pd.Series([f"Responsable{i % 40}" for i in range(len(ids))], index=ids)
+    paises = {'AR': 'ARGENTINA', 'BO': 'BOLIVIA', 'BR': 'BRASIL', 'PY': 'PARAGUAY', 'UR': 'URUGUAY'}
+
+    def fuente(cantidad):
+        elegidas = ids[rng.integers(0, len(ids), cantidad)]
+        fechas = pd.Series(pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, cantidad), unit='D'))
+        return pd.DataFrame({
+            'IDOperacion': elegidas,
+            'Responsable': responsables.loc[elegidas].to_numpy(),
+            'Monto': rng.uniform(1e4, 3e6, cantidad).round(2),
+            'Year': fechas.dt.year,
+            'Month': fechas.dt.month,
+            'Pais': pd.Series(elegidas).str[:2].map(paises),
+        })
+
+    return {'Ejecutados': fuente(filas), 'Proyectados': fuente(filas // 2), 'ProyeccionesIniciales': fuente(filas // 3)}
+
+
+def _conciliar_con_apply(fuentes):
+    # Versión anterior de la página 5: dos merges y un apply por fila
+    claves = conciliacion.CLAVES
+    grupos = [df.groupby(claves + ['Responsable']).agg({'Monto': 'sum'}).rename(columns={'Monto': nombre}).reset_index()
+              for nombre, df in fuentes.items()]
+    merged_data = pd.merge(grupos[0], grupos[1], on=claves, how='outer')
+    merged_data = pd.merge(merged_data, grupos[2], on=claves, how='outer').fillna(0)
+
+    def elegir_responsable(row):
+        if pd.notna(row['Responsable_x']) and row['Responsable_x'] != 0:
+            return row['Responsable_x']
+        elif pd.notna(row['Responsable_y']) and row['Responsable_y'] != 0:
+            return row['Responsable_y']
+        else:
+            return row['Responsable']
+
+    merged_data['Responsable'] = merged_data.apply(elegir_responsable, axis=1)
+    return merged_data.drop(['Responsable_x', 'Responsable_y'], axis=1)
+
+
+def bench_reconcile(filas=500_000):
+    fuentes = cartera_sintetica(filas)
+    esperado, t_apply = _medir(_conciliar_con_apply, fuentes)
+    obtenido, t_vectorizado = _medir(conciliacion.reconcile, fuentes)
+    pd.testing.assert_frame_equal(obtenido[esperado.columns], esperado, check_dtype=False)
+    print(f"reconcile ({filas} filas, {len(obtenido)} grupos): merge+apply {t_apply:.3f} s, "
+          f"vectorizado {t_vectorizado:.3f} s, {t_apply / t_vectorizado:.1f}x")
+
+
+def tabla_sintetica(filas, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'IDDesembolso': np.arange(filas),
+        'IDEtapa': pd.Categorical(rng.choice([f"AR{i:03d}_1" for i in range(300)], filas)),
+        'Pais': pd.Categorical(rng.choice(['ARGENTINA', 'BOLIVIA', 'BRASIL', 'PARAGUAY', 'URUGUAY'], filas)),
+        'Monto': rng.uniform(0, 5000, filas).round(0),
+        'Porcentaje': rng.uniform(0, 100, filas).round(2),
+        'FechaEfectiva': pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, filas), unit='D'),
+    })
+
+
+def _excel_rss(modo, filas):
+    # Se ejecuta en un proceso aparte para medir su pico de memoria
+    df = tabla_sintetica(filas)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'salida.xlsx')
+        if modo == 'streaming':
+            exportar.write_excel_streaming(df, ruta)
+        else:
+            with open(ruta, 'wb') as archivo:
+                archivo.write(exportar.dataframe_to_excel_bytes(df))
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print((pico - base) // 1024)
+
+
+def bench_excel_rss(filas=200_000):
+    for modo in ('completo', 'streaming'):
+        inicio = time.perf_counter()
+        salida = subprocess.run(
+            [sys.executable, __file__, '--excel-rss', modo, str(filas)],
+            check=True, capture_output=True, text=True,
+        )
+        segundos = time.perf_counter() - inicio
+        print(f"Excel {modo} ({filas} filas, motor {exportar.EXCEL_ENGINE}): "
+              f"pico RSS +{salida.stdout.strip()} MB, {segundos:.1f} s")
+
+
+def bench_forecast(filas=200_000, seed=0):
+    rng = np.random.default_rng(seed)
+    sectores = rng.choice(curvas.SECTORES, filas)
+    años = rng.uniform(0, 10, filas)
+    coeficientes = curvas.COEFICIENTES_BASE
+    esperado, t_bucle = _medir(lambda: [np.polyval(coeficientes[s], a) for s, a in zip(sectores, años)])
+    obtenido, t_vectorizado = _medir(curvas.forecast, sectores, años, coeficientes)
+    np.testing.assert_allclose(obtenido['PorcentajeAcumulado'], esperado)
+    print(f"forecast ({filas} pares sector-año): bucle {t_bucle:.3f} s, vectorizado {t_vectorizado:.3f} s, "
+          f"{t_bucle / t_vectorizado:.1f}x")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--excel-rss']:
+        _excel_rss(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench_parse_amounts(filas)
+    bench_reconcile(min(filas, 500_000))
+    bench_excel_rss(min(filas, 200_000))
+    bench_forecast(min(filas, 200_000))
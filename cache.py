@@ -0,0 +1,110 @@
+import contextlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Diccionario compartido entre hilos que descarta lo usado hace más tiempo.
+
+    Se acota por cantidad de entradas (`max_entradas`) o por la suma de
+    `tamaño(valor)` (`max_bytes`); la entrada más reciente siempre se conserva.
+    Los valores se construyen fuera del lock, así una construcción lenta no
+    bloquea las lecturas de otras claves.
+    """
+
+    def __init__(self, max_entradas=None, max_bytes=None, tamaño=len):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.tamaño = tamaño
+        self._lock = threading.Lock()
+        self._valores = OrderedDict()
+        self._bytes = 0
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._valores.get(clave)
+            if valor is not None:
+                self._valores.move_to_end(clave)
+            return valor
+
+    def put(self, clave, valor):
+        """Guarda `valor` y devuelve el que queda en la caché.
+
+        Si otro hilo guardó la misma clave mientras tanto, se conserva ese.
+        """
+        with self._lock:
+            if clave in self._valores:
+                self._valores.move_to_end(clave)
+                return self._valores[clave]
+            self._valores[clave] = valor
+            if self.max_bytes is not None:
+                self._bytes += self.tamaño(valor)
+            while len(self._valores) > 1 and self._excedida():
+                _, descartado = self._valores.popitem(last=False)
+                if self.max_bytes is not None:
+                    self._bytes -= self.tamaño(descartado)
+            return valor
+
+    def get_or_build(self, clave, construir):
+        """Valor de `clave`, llamando a `construir()` sólo si no está."""
+        valor = self.get(clave)
+        if valor is None:
+            valor = self.put(clave, construir())
+        return valor
+
+    def clear(self):
+        with self._lock:
+            self._valores.clear()
+            self._bytes = 0
+
+    def _excedida(self):
+        if self.max_entradas is not None and len(self._valores) > self.max_entradas:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+
+@contextlib.contextmanager
+def atomic_path(ruta):
+    """Ruta temporal junto a `ruta` que la reemplaza al salir sin errores.
+
+    Quien lee `ruta` ve el archivo anterior o el nuevo completo, nunca uno a
+    medio escribir. Si hay un error el temporal se borra y `ruta` no cambia.
+    """
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    os.close(descriptor)
+    try:
+        yield temporal
+        os.replace(temporal, ruta)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporal)
+
+
+def touch(ruta):
+    """Marca `ruta` como recién usada para `prune_dir`."""
+    with contextlib.suppress(FileNotFoundError):
+        os.utime(ruta)
+
+
+def prune_dir(directorio, conservar):
+    """Deja en `directorio` sólo los `conservar` archivos usados más recientemente.
+
+    El uso se mide por la fecha de modificación; los temporales de
+    `atomic_path` en curso no se tocan.
+    """
+    if not os.path.isdir(directorio):
+        return
+    archivos = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.tmp'):
+            with contextlib.suppress(FileNotFoundError):
+                ruta = os.path.join(directorio, nombre)
+                archivos.append((os.path.getmtime(ruta), ruta))
+    archivos.sort()
+    for _, anterior in archivos[:max(len(archivos) - conservar, 0)]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(anterior)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Claves por las que se concilian ejecutados, proyectados y proyecciones iniciales
+CLAVES = ['Pais', 'IDOperacion', 'Year', 'Month']
+
+
+def _codigos(columnas):
+    """Código entero por combinación de valores, en orden lexicográfico."""
+    codigo = np.zeros(len(columnas[0]), dtype=np.int64)
+    for columna in columnas:
+        codigos, valores = pd.factorize(columna, sort=True)
+        # Se vuelve a factorizar para que los códigos sigan siendo chicos
+        codigo, _ = pd.factorize(codigo * len(valores) + codigos, sort=True)
+    return codigo
+
+
+def _responsable(columnas):
+    # La primera columna con un valor distinto de nulo/0 gana, como en la
+    # versión original fila por fila
+    responsable = columnas[-1]
+    for columna in reversed(columnas[:-1]):
+        responsable = columna.where(columna.notna() & columna.ne(0), responsable)
+    return responsable
+
+
+def reconcile_merge(fuentes, claves=CLAVES):
+    """Conciliación con merges sucesivos.
+
+    Es la ruta general: si una fuente tiene varios responsables para las
+    mismas claves, las filas se combinan todas contra todas como en un merge.
+    """
+    nombres = list(fuentes)
+    resultado = None
+    for numero, (nombre, df) in enumerate(fuentes.items()):
+        agrupado = (df.groupby(claves + ['Responsable'])['Monto'].sum()
+                    .rename(nombre).reset_index()
+                    .rename(columns={'Responsable': f'Responsable_{numero}'}))
+        resultado = agrupado if resultado is None else pd.merge(resultado, agrupado, on=claves, how='outer')
+    resultado = resultado.fillna(0)
+    columnas = [f'Responsable_{numero}' for numero in range(len(nombres))]
+    resultado['Responsable'] = _responsable([resultado[columna] for columna in columnas])
+    return resultado[claves + nombres + ['Responsable']]
+
+
+def reconcile(fuentes, claves=CLAVES):
+    """Concilia los montos de varias fuentes por `claves` en una sola pasada.
+
+    `fuentes` mapea el nombre de cada medida a un DataFrame con `claves`,
+    'Responsable' y 'Monto', en orden de prioridad para 'Responsable'. Las
+    claves se factorizan a enteros y todas las fuentes se suman en un único
+    groupby. Devuelve una fila por combinación de claves, ordenada, con 0
+    donde una fuente no tiene datos.
+    """
+    nombres = list(fuentes)
+    # Igual que un groupby, se descartan las filas con claves o responsable nulos
+    filas = pd.concat(
+        [df[claves + ['Responsable', 'Monto']].dropna(subset=claves + ['Responsable']).assign(Fuente=numero)
+         for numero, df in enumerate(fuentes.values())],
+        ignore_index=True,
+    )
+    grupo = _codigos([filas[columna] for columna in claves])
+    responsables, valores_responsable = pd.factorize(filas['Responsable'])
+
+    cantidad = max(len(valores_responsable), 1)
+    clave = (grupo * len(nombres) + filas['Fuente'].to_numpy()) * cantidad + responsables
+    sumas = filas['Monto'].groupby(clave).sum()
+    grupo_fuente, responsable = np.divmod(sumas.index.to_numpy(), cantidad)
+    if pd.Index(grupo_fuente).has_duplicates:
+        # Más de un responsable por claves en una misma fuente
+        return reconcile_merge(fuentes, claves)
+
+    grupos, fuente = np.divmod(grupo_fuente, len(nombres))
+    # Los códigos de grupo van de 0 a n-1: la primera fila de cada uno da sus claves
+    primeras = np.empty(grupo.max() + 1 if len(grupo) else 0, dtype=np.intp)
+    primeras[grupo[::-1]] = np.arange(len(grupo) - 1, -1, -1)
+    resultado = filas[claves].iloc[primeras].reset_index(drop=True)
+    montos = np.zeros((len(resultado), len(nombres)))
+    montos[grupos, fuente] = sumas.to_numpy()
+    for numero, nombre in enumerate(nombres):
+        resultado[nombre] = montos[:, numero]
+
+    # Se completa de la fuente menos prioritaria a la más prioritaria
+    codigos = np.full(len(resultado), -1)
+    for numero in reversed(range(len(nombres))):
+        de_fuente = fuente == numero
+        codigos[grupos[de_fuente]] = responsable[de_fuente]
+    resultado['Responsable'] = np.asarray(valores_responsable)[codigos]
+    return resultado
@@ -0,0 +1,57 @@
+import threading
+
+import pandas as pd
+
+# Dimensiones por las que filtra y resume la página de análisis de desembolsos
+DIMENSIONES = ['Pais', 'Año', 'Mes', 'IDAreaPrioritaria', 'IDAreaIntervencion']
+
+_lock = threading.Lock()
+_cubos = {}
+
+
+def _etapas(serie):
+    return frozenset(serie.dropna())
+
+
+def build_cube(df):
+    """Agrega la tabla de hechos por todas las dimensiones de filtro.
+
+    Cada celda guarda la suma de 'Monto' y el conjunto exacto de 'IDEtapa',
+    así los conteos de proyectos únicos se pueden combinar entre celdas.
+    """
+    # dropna=False conserva las filas sin país, fecha o sector, que también
+    # cuentan en los resúmenes
+    return df.groupby(DIMENSIONES, observed=True, dropna=False).agg(
+        Suma_Monto=('Monto', 'sum'),
+        Etapas=('IDEtapa', _etapas),
+    ).reset_index()
+
+
+def get_cube(version, vista, escala='millones'):
+    """Cubo de `vista`, calculado una vez por versión de datos.
+
+    `version` y `vista` deben venir de la misma llamada a `desembolsos.get_view`
+    con `escala`.
+    """
+    clave = (version, escala)
+    with _lock:
+        cubo = _cubos.get(clave)
+    if cubo is None:
+        cubo = build_cube(vista)
+        with _lock:
+            _cubos.clear()
+            _cubos[clave] = cubo
+    return cubo
+
+
+def roll_up(cubo, dimension, conteo='Proyectos'):
+    """Resume el cubo por `dimension`: proyectos únicos y suma de 'Monto'.
+
+    Equivale a agrupar las filas originales con nunique de 'IDEtapa' y sum.
+    """
+    grupos = cubo.groupby(dimension, observed=True)
+    resumen = pd.DataFrame({
+        conteo: grupos['Etapas'].agg(lambda etapas: len(frozenset().union(*etapas))),
+        'Suma_Monto': grupos['Suma_Monto'].sum(),
+    })
+    return resumen.reset_index()
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import cache
+import desembolsos
+import pivotes
+import snapshots
+
+LOGGER = logging.getLogger(__name__)
+
+# Archivo con los ajustes guardados, junto a las instantáneas
+CURVAS_PATH = os.path.join(snapshots.SNAPSHOT_DIR, "curvas.json")
+
+# Etapas que entran en las curvas de desembolso acumulado
+ETAPAS_INCLUIDAS = [
+    "AR030_1", "AR031_2", "AR033_1", "AR038_1", "AR043_1", "AR043_2", "AR044_1",
+    "UR018_1", "UR021_1", "UR022_1", "UR023_1", "AR031_1", "AR044_2", "AR046_1",
+    "AR048_1", "BO024_1", "BO030_1", "BO032_1", "PY016_2", "UR019_1", "AR020_1",
+    "AR026_1", "AR040_1", "BO020_1", "BO023_1", "BO029_1", "BR025_1", "PY021_1",
+    "PY026_1", "UR016_1", "UR017_1", "UR020_1", "AR019_1", "AR022_1", "AR027_1",
+    "BO025_1", "BO032_2", "PY020_2", "AR021_1", "AR024_1", "AR037_1", "PY020_1",
+    "AR025_1", "AR028_1", "BO028_1", "BR016_1", "BO021_1", "BO022_1", "UR014_1"
+]
+
+# Etapas que se excluyen aunque figuren en ETAPAS_INCLUIDAS
+ETAPAS_EXCLUIDAS = [
+    "AR030_1", "UR018_1", "UR021_1", "UR022_1", "UR023_1", "AR031_1", "AR031_2",
+    "AR033_1", "AR044_1", "AR044_2", "AR046_1", "BO030_1", "BO032_1", "UR019_1",
+    "AR038_1", "AR043_1", "AR043_2"
+]
+
+# Grado del polinomio de cada sector en el pronóstico
+SECTORES = ['Todos', 'INF', 'SOC', 'PRO']
+GRADOS = {'Todos': 4, 'INF': 4, 'SOC': 4, 'PRO': 3}
+
+# Coeficientes de mayor a menor grado usados antes de tener ajustes guardados;
+# se usan si no hay un ajuste de la curva que sea plausible
+COEFICIENTES_BASE = {
+    'Todos': [0.0183, -0.0281, -3.8759, 33.508, 18.887],
+    'INF': [0.0065, 0.286, -6.5063, 40.386, 19.582],
+    'SOC': [0.0787, -1.2018, 3.7085, 16.575, 22.619],
+    'PRO': [0.1935, -4.3676, 33.192, 13.825],
+}
+
+# Años desde la vigencia que cubren las curvas; en ese tramo un ajuste debe
+# quedar dentro de [0, 100] para usarse en el pronóstico
+HORIZONTE_AÑOS = 8
+
+_lock = threading.Lock()
+_curvas = None
+
+
+def fit_polynomial(x, y, grado):
+    """Ajuste polinómico por mínimos cuadrados con NumPy.
+
+    Devuelve (coeficientes de mayor a menor grado, R²), o None si no hay
+    puntos. Con menos puntos que coeficientes da la solución de norma mínima.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if not len(x):
+        return None
+    vander = np.vander(x, grado + 1)
+    coeficientes = np.linalg.lstsq(vander, y, rcond=None)[0]
+    residuo = ((y - vander @ coeficientes) ** 2).sum()
+    total = ((y - y.mean()) ** 2).sum()
+    r2 = 1 - residuo / total if total > 0 else 0.0
+    return coeficientes, float(r2)
+
+
+def filter_stages(df, incluidas=ETAPAS_INCLUIDAS, excluidas=ETAPAS_EXCLUIDAS):
+    """Filas de `df` cuyas etapas están en `incluidas` y no en `excluidas`."""
+    return df[df['IDEtapa'].isin(incluidas) & ~df['IDEtapa'].isin(excluidas)]
+
+
+def cohort(sector='Todos', paises='Todos', grado=3, incluidas=ETAPAS_INCLUIDAS, excluidas=ETAPAS_EXCLUIDAS):
+    """Descripción de una cohorte: qué datos y qué grado definen su curva."""
+    return {
+        'sector': sector,
+        'paises': paises if paises == 'Todos' else sorted(paises),
+        'grado': grado,
+        'incluidas': sorted(incluidas),
+        'excluidas': sorted(excluidas),
+    }
+
+
+def cohort_points(df, sector='Todos', incluidas=ETAPAS_INCLUIDAS, excluidas=ETAPAS_EXCLUIDAS):
+    """Puntos (Año, PorcentajeAcumulado) de un sector, como en la regresión por proyecto."""
+    if sector != 'Todos':
+        df = df[df['IDAreaPrioritaria'] == sector]
+    porcentaje = pivotes.build_pivots(df, ['Porcentaje'])['Porcentaje']
+    return filter_stages(pivotes.cumulative_long(porcentaje), incluidas, excluidas)
+
+
+def _clave(cohorte):
+    return hashlib.sha256(json.dumps(cohorte, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _cargar():
+    global _curvas
+    if _curvas is None:
+        try:
+            with open(CURVAS_PATH, encoding='utf-8') as archivo:
+                _curvas = json.load(archivo)
+        except FileNotFoundError:
+            _curvas = {}
+        except ValueError:
+            LOGGER.warning("Archivo de curvas ilegible, se descarta: %s", CURVAS_PATH, exc_info=True)
+            _curvas = {}
+    return _curvas
+
+
+def _guardar(curvas):
+    try:
+        with cache.atomic_path(CURVAS_PATH) as temporal, open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(curvas, archivo, indent=1)
+    except OSError:
+        LOGGER.warning("No se pudieron guardar las curvas en %s", CURVAS_PATH, exc_info=True)
+
+
+def stored_fit(cohorte):
+    """Último ajuste guardado de `cohorte`, de cualquier versión, o None."""
+    with _lock:
+        return _cargar().get(_clave(cohorte))
+
+
+def get_fit(cohorte, version, puntos):
+    """Ajuste de `cohorte` para la versión de datos `version`.
+
+    Se calcula una sola vez por versión y queda guardado en CURVAS_PATH con
+    su R². `puntos()` devuelve el DataFrame con 'Año' y 'PorcentajeAcumulado'
+    y sólo se llama si no hay un ajuste vigente. Devuelve un dict con
+    'coeficientes', 'r2', 'puntos' y 'version', o None si no hay puntos.
+    """
+    clave = _clave(cohorte)
+    with _lock:
+        ajuste = _cargar().get(clave)
+    if ajuste is not None and ajuste['version'] == list(version):
+        return ajuste
+
+    datos = puntos()
+    resultado = fit_polynomial(datos['Año'], datos['PorcentajeAcumulado'], cohorte['grado'])
+    if resultado is None:
+        return None
+    coeficientes, r2 = resultado
+    ajuste = {
+        'cohorte': cohorte,
+        'coeficientes': coeficientes.tolist(),
+        'r2': r2,
+        'puntos': len(datos),
+        'version': list(version),
+    }
+    with _lock:
+        curvas = _cargar()
+        curvas[clave] = ajuste
+        _guardar(curvas)
+    return ajuste
+
+
+def plausible(ajuste, grado, horizonte=HORIZONTE_AÑOS):
+    """Si `ajuste` sirve para pronosticar: más puntos que coeficientes y la
+    curva dentro de [0, 100] entre el año 0 y `horizonte`."""
+    if ajuste is None or ajuste['puntos'] <= grado:
+        return False
+    valores = np.polyval(ajuste['coeficientes'], np.linspace(0, horizonte, 8 * horizonte + 1))
+    return bool(np.all((valores >= 0) & (valores <= 100)))
+
+
+def sector_fits():
+    """Ajuste que usa el pronóstico para cada sector: dict sector -> ajuste.
+
+    Cada ajuste es el de `get_fit` con los datos vigentes. Si las hojas no se
+    pueden cargar o el ajuste no es `plausible`, se usa el último guardado
+    (si lo es), y si no, None: el sector usa COEFICIENTES_BASE.
+    """
+    try:
+        version, vista = desembolsos.get_view('miles', solo_vigentes=True)
+    except Exception:
+        LOGGER.warning("No se pudieron cargar los datos para ajustar las curvas", exc_info=True)
+        version = None
+
+    ajustes = {}
+    for sector in SECTORES:
+        cohorte = cohort(sector=sector, grado=GRADOS[sector])
+        guardado = stored_fit(cohorte)
+        ajuste = None
+        if version is not None:
+            try:
+                ajuste = get_fit(cohorte, version, lambda sector=sector: cohort_points(vista, sector))
+            except Exception:
+                LOGGER.warning("No se pudo ajustar la curva del sector %s", sector, exc_info=True)
+        if not plausible(ajuste, GRADOS[sector]):
+            ajuste = guardado if plausible(guardado, GRADOS[sector]) else None
+        ajustes[sector] = ajuste
+    return ajustes
+
+
+def sector_curves(ajustes=None):
+    """Coeficientes por sector para el pronóstico, de `sector_fits()` o COEFICIENTES_BASE."""
+    ajustes = sector_fits() if ajustes is None else ajustes
+    return {
+        sector: COEFICIENTES_BASE[sector] if ajustes.get(sector) is None else ajustes[sector]['coeficientes']
+        for sector in SECTORES
+    }
+
+
+def forecast(sectores, años, coeficientes=None):
+    """PorcentajeAcumulado pronosticado para cada par (sector, año).
+
+    `sectores` y `años` tienen el mismo largo y los años pueden ser
+    fraccionarios. Los coeficientes de cada fila se toman de una matriz
+    rellenada al grado máximo y todas las curvas se evalúan juntas con el
+    esquema de Horner. Por defecto usa `sector_curves()`.
+    """
+    coeficientes = sector_curves() if coeficientes is None else coeficientes
+    sectores = np.asarray(sectores, dtype=object)
+    años = np.asarray(años, dtype=float)
+
+    codigos, valores = pd.factorize(sectores)
+    grado = max((len(coeficientes[sector]) for sector in valores), default=1) - 1
+    # Una fila por sector; los grados menores se completan con ceros a la izquierda
+    matriz = np.zeros((len(valores), grado + 1))
+    for fila, sector in enumerate(valores):
+        matriz[fila, grado + 1 - len(coeficientes[sector]):] = coeficientes[sector]
+
+    por_fila = matriz[codigos]
+    porcentaje = por_fila[:, 0].copy()
+    for columna in range(1, grado + 1):
+        porcentaje = porcentaje * años + por_fila[:, columna]
+    return pd.DataFrame({'Sector': sectores, 'Año': años, 'PorcentajeAcumulado': porcentaje})
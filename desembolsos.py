@@ -0,0 +1,304 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import sheets
+import snapshots
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+LOGGER = logging.getLogger(__name__)
+
+FUENTES = {
+    'proyectos': sheets.sheet_url_proyectos,
+    'operaciones': sheets.sheet_url_operaciones,
+    'desembolsos': sheets.sheet_url_desembolsos,
+}
+
+# Divisor y decimales de 'Monto' para cada vista
+ESCALAS = {
+    'miles': (1000, 0),
+    'millones': (1000000, 3),
+}
+
+# Tipos compactos de la tabla de hechos: las columnas de texto repetidas en
+# cada desembolso pasan a categorías y los enteros a su tamaño mínimo
+ESQUEMA_COMPACTO = {
+    'NoProyecto': 'category',
+    'NoOperacion': 'category',
+    'IDEtapa': 'category',
+    'IDOperacion': 'category',
+    'Alias': 'category',
+    'Pais': 'category',
+    'Estado': 'category',
+    'IDAreaPrioritaria': 'category',
+    'AreaPrioritaria': 'category',
+    'IDAreaIntervencion': 'category',
+    'AreaIntervencion': 'category',
+    'Ano': 'int16',
+    'Año': 'int16',
+    'Mes': 'int8',
+}
+
+_lock = threading.Lock()
+_tablas = {}
+_vistas = {}
+
+# Número decimal que float() acepta sin ambigüedad, una vez limpiado el monto
+_PATRON_NUMERO = r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'
+
+
+def clean_and_convert_to_float(monto_str):
+    if pd.isna(monto_str):
+        return np.nan
+    try:
+        # Asumiendo que 'monto_str' es una cadena, remover puntos de los miles y cambiar comas por puntos para decimales
+        cleaned_monto = monto_str.replace('.', '').replace(',', '.')
+        return float(cleaned_monto)
+    except ValueError:
+        # Si hay un error en la conversión, retorna NaN
+        return np.nan
+
+
+def _convertir_arrow(serie):
+    """Montos de una Serie de texto convertidos con pyarrow.compute.
+
+    Devuelve (Serie float, máscara NumPy de las cadenas que no tienen forma
+    de número y quedan para la conversión escalar).
+    """
+    if isinstance(serie.dtype, pd.ArrowDtype) or getattr(serie.dtype, 'storage', None) == 'pyarrow':
+        # Con texto respaldado por Arrow el array se toma sin copiar
+        texto = pa.array(serie.array)
+    else:
+        texto = pa.array(serie.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    texto = pc.replace_substring(pc.replace_substring(texto, '.', ''), ',', '.')
+    texto = pc.utf8_trim_whitespace(texto)
+    valido = pc.fill_null(pc.match_substring_regex(texto, _PATRON_NUMERO), False)
+    numeros = pc.cast(pc.if_else(valido, texto, pa.scalar(None, texto.type)), pa.float64())
+    pendientes = pc.and_(pc.is_valid(texto), pc.invert(valido))
+    resultado = pd.Series(numeros.to_numpy(zero_copy_only=False), index=serie.index)
+    return resultado, pendientes.to_numpy(zero_copy_only=False)
+
+
+def _convertir_valor(valor):
+    # Columnas object con números mezclados entre las cadenas
+    if isinstance(valor, str):
+        return clean_and_convert_to_float(valor)
+    return np.nan if pd.isna(valor) else float(pd.to_numeric(valor, errors='coerce'))
+
+
+def parse_amounts(valores):
+    """`clean_and_convert_to_float` aplicada a una Serie.
+
+    Convierte montos con formato "1.234.567,89" a float. Los NaN se mantienen,
+    los valores ya numéricos se devuelven tal cual y los mal formados quedan NaN.
+    Las columnas de texto se convierten de forma vectorizada con pyarrow; sin
+    pyarrow, o con números mezclados entre las cadenas, valor por valor.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie.astype(float)
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+        return pd.to_numeric(serie, errors='coerce').astype(float)
+
+    if pa is None or tipo != 'string':
+        return serie.map(_convertir_valor).astype(float)
+
+    resultado, pendientes = _convertir_arrow(serie)
+
+    # Las pocas cadenas que no pasaron la ruta vectorizada (p. ej. "1_000" o
+    # "inf", que float() acepta) se resuelven con la conversión escalar
+    if pendientes.any():
+        resultado[pendientes] = serie[pendientes].map(clean_and_convert_to_float)
+    return resultado
+
+
+# Columnas y tipos de cada hoja fuente; lo que no figura no se lee
+ESQUEMAS = {
+    'proyectos': sheets.Esquema(
+        {'NoProyecto': str, 'IDAreaPrioritaria': str, 'AreaPrioritaria': str, 'IDAreaIntervencion': str, 'AreaIntervencion': str},
+    ),
+    'operaciones': sheets.Esquema(
+        {'NoProyecto': str, 'NoOperacion': str, 'IDEtapa': str, 'Alias': str, 'Pais': str, 'Estado': str},
+        fechas={'FechaVigencia': '%d/%m/%Y'},
+        convertidores={'AporteFONPLATAVigente': parse_amounts},
+    ),
+    'desembolsos': sheets.Esquema(
+        {'IDDesembolso': 'Int64', 'IDOperacion': str},
+        fechas={'FechaEfectiva': '%d/%m/%Y'},
+        convertidores={'Monto': parse_amounts},
+    ),
+}
+
+
+def build_fact_table(df_proyectos, df_operaciones, df_operaciones_desembolsos):
+    """Une desembolsos, operaciones y proyectos en la tabla de hechos canónica.
+
+    Las hojas deben venir leídas con ESQUEMAS, con fechas y montos ya
+    convertidos. 'Monto' queda en unidades originales; las escalas se
+    aplican en `get_view`.
+    """
+    df_proyectos = df_proyectos[['NoProyecto', 'IDAreaPrioritaria','AreaPrioritaria','IDAreaIntervencion','AreaIntervencion']]
+    df_operaciones = df_operaciones[['NoProyecto', 'NoOperacion', 'IDEtapa', 'Alias', 'Pais', 'FechaVigencia', 'Estado', 'AporteFONPLATAVigente']]
+    df_operaciones_desembolsos = df_operaciones_desembolsos[['IDDesembolso', 'IDOperacion', 'Monto', 'FechaEfectiva']]
+
+    merged_df = pd.merge(df_operaciones_desembolsos, df_operaciones, left_on='IDOperacion', right_on='IDEtapa', how='left')
+    merged_df = pd.merge(merged_df, df_proyectos, on='NoProyecto', how='left')
+
+    merged_df['Ano'] = ((merged_df['FechaEfectiva'] - merged_df['FechaVigencia']).dt.days / 366).fillna(-1)
+    merged_df['Ano'] = merged_df['Ano'].astype(int)
+
+    merged_df['Porcentaje'] = ((merged_df['Monto'] / merged_df['AporteFONPLATAVigente']) * 100).round(2)
+
+    # Extraer el año y el mes de la columna 'FechaEfectiva'
+    merged_df['Año'] = merged_df['FechaEfectiva'].dt.year
+    merged_df['Mes'] = merged_df['FechaEfectiva'].dt.month
+    return merged_df
+
+
+def memory_report(antes, despues):
+    """Memoria en bytes por columna antes y después de compactar."""
+    reporte = pd.DataFrame({
+        'Antes': antes.memory_usage(index=False, deep=True),
+        'Despues': despues.memory_usage(index=False, deep=True),
+    })
+    reporte.loc['Total'] = reporte.sum()
+    return reporte
+
+
+def compact(df, esquema=ESQUEMA_COMPACTO):
+    """Convierte las columnas del esquema a tipos compactos.
+
+    Un entero con nulos (p. ej. 'Año' de una fecha vacía) queda en float32,
+    así los filtros por igualdad siguen tratando el nulo como distinto.
+    """
+    tipos = {}
+    for columna, tipo in esquema.items():
+        if columna not in df.columns:
+            continue
+        if tipo != 'category' and df[columna].isna().any():
+            tipo = 'float32'
+        tipos[columna] = tipo
+    compacto = df.astype(tipos)
+    reporte = memory_report(df, compacto)
+    LOGGER.info(
+        "Tabla compactada de %.1f MB a %.1f MB",
+        reporte.loc['Total', 'Antes'] / 1e6, reporte.loc['Total', 'Despues'] / 1e6,
+    )
+    return compacto
+
+
+def row_hashes(df_operaciones_desembolsos):
+    """Hash de cada fila cruda de desembolsos, para detectar altas y cambios."""
+    filas = df_operaciones_desembolsos[['IDDesembolso', 'IDOperacion', 'Monto', 'FechaEfectiva']]
+    return pd.DataFrame({
+        'IDDesembolso': filas['IDDesembolso'].to_numpy(),
+        'Hash': pd.util.hash_pandas_object(filas, index=False).to_numpy(),
+    })
+
+
+def update_fact_table(tabla, hashes_anteriores, df_proyectos, df_operaciones, df_operaciones_desembolsos):
+    """Actualiza la tabla de hechos uniendo sólo los desembolsos nuevos o
+    modificados desde la instantánea anterior.
+
+    Sólo es válido si proyectos y operaciones no cambiaron. Devuelve None si
+    'IDDesembolso' no identifica las filas, en la hoja actual o en la
+    instantánea anterior, y hace falta reconstruir todo.
+    """
+    hashes = row_hashes(df_operaciones_desembolsos)
+    if hashes['IDDesembolso'].duplicated().any() or hashes_anteriores['IDDesembolso'].duplicated().any():
+        return None
+
+    # Filas conservadas: las que siguen idénticas en la hoja
+    sin_cambios = hashes_anteriores.loc[hashes_anteriores['Hash'].isin(hashes['Hash']), 'IDDesembolso']
+    tabla = tabla[tabla['IDDesembolso'].isin(sin_cambios)]
+
+    nuevas = ~hashes['Hash'].isin(hashes_anteriores['Hash']).to_numpy()
+    if nuevas.any():
+        agregadas = build_fact_table(df_proyectos, df_operaciones, df_operaciones_desembolsos[nuevas])
+        tabla = pd.concat([tabla, agregadas], ignore_index=True)
+
+    # Mismo orden que tendría una reconstrucción completa
+    posicion = pd.Index(hashes['IDDesembolso']).get_indexer(tabla['IDDesembolso'])
+    tabla = tabla.iloc[np.argsort(posicion, kind='stable')].reset_index(drop=True)
+    return tabla, hashes
+
+
+def _construir(version):
+    hojas = sheets.load_sheets({nombre: (url, ESQUEMAS[nombre]) for nombre, url in FUENTES.items()})
+    versiones = dict(zip(FUENTES, version))
+
+    anterior = snapshots.load_latest('desembolsos')
+    filas_anteriores = snapshots.load_latest('desembolsos_filas')
+    resultado = None
+    if anterior is not None and filas_anteriores is not None and anterior[0] == filas_anteriores[0]:
+        previas = dict(zip(FUENTES, anterior[0]))
+        # Si proyectos u operaciones cambiaron, todas las filas pueden cambiar
+        if all(previas[nombre] == versiones[nombre] for nombre in ('proyectos', 'operaciones')):
+            resultado = update_fact_table(anterior[1], filas_anteriores[1], hojas['proyectos'], hojas['operaciones'], hojas['desembolsos'])
+
+    if resultado is None:
+        tabla = build_fact_table(hojas['proyectos'], hojas['operaciones'], hojas['desembolsos'])
+        hashes = row_hashes(hojas['desembolsos'])
+    else:
+        tabla, hashes = resultado
+    tabla = compact(tabla)
+    snapshots.save('desembolsos', version, tabla)
+    snapshots.save('desembolsos_filas', version, hashes)
+    return tabla
+
+
+def data_version():
+    """Versión de los datos: el hash de contenido de cada hoja fuente."""
+    return sheets.versions(list(FUENTES.values()))
+
+
+def get_fact_table():
+    """Devuelve (versión, tabla de hechos), construyéndola una vez por versión.
+
+    La tabla se comparte entre páginas y sesiones: no debe modificarse.
+    """
+    version = data_version()
+    with _lock:
+        tabla = _tablas.get(version)
+    if tabla is not None:
+        return version, tabla
+
+    # Tras un reinicio, la instantánea en disco evita volver a parsear las
+    # hojas si ninguna cambió
+    tabla = snapshots.load('desembolsos', version)
+    if tabla is None:
+        tabla = _construir(version)
+    with _lock:
+        _tablas.clear()
+        _vistas.clear()
+        _tablas[version] = tabla
+    return version, tabla
+
+
+def get_view(escala='miles', solo_vigentes=False):
+    """Devuelve (versión, vista) de la tabla de hechos con 'Monto' escalado y,
+    opcionalmente, sólo los desembolsos posteriores a la vigencia ('Ano' >= 0).
+
+    Lo que se memorice a partir de la vista debe usar esta misma versión como
+    clave, no la de otra llamada. Las vistas se memorizan por versión de datos
+    y también son de sólo lectura.
+    """
+    version, tabla = get_fact_table()
+    clave = (version, escala, solo_vigentes)
+    with _lock:
+        vista = _vistas.get(clave)
+    if vista is None:
+        divisor, decimales = ESCALAS[escala]
+        vista = tabla[tabla['Ano'] >= 0] if solo_vigentes else tabla
+        vista = vista.assign(Monto=(vista['Monto'] / divisor).round(decimales))
+        with _lock:
+            _vistas[clave] = vista
+    return version, vista
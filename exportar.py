@@ -0,0 +1,191 @@
+import hashlib
+import importlib.util
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import cache
+
+# xlsxwriter escribe bastante más rápido que openpyxl; si no está instalado
+# se usa openpyxl como hasta ahora
+EXCEL_ENGINE = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') else 'openpyxl'
+
+# Bytes máximos de archivos generados que se conservan en memoria
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Filas de datos por hoja de Excel (el límite es 1.048.576 contando el encabezado)
+EXCEL_MAX_FILAS = 1048575
+
+# A partir de esta cantidad de filas el Excel se escribe en modo streaming a
+# un archivo temporal, sin armar el libro completo con openpyxl/xlsxwriter en
+# memoria. Al descargarlo, Streamlit igual lee los bytes del archivo
+STREAMING_MIN_FILAS = 50000
+STREAMING_CHUNK = 10000
+
+# Archivos de exportación grandes que se conservan en disco
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'desembolsos-exportaciones')
+MAX_EXPORT_FILES = 8
+
+FORMATOS = {
+    'xlsx': ('Excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV', 'text/csv'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+}
+
+_archivos = cache.LRUCache(max_bytes=MAX_CACHE_BYTES)
+
+
+def content_hash(df):
+    """Hash del contenido de un DataFrame: valores, índice, columnas y tipos."""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(repr(list(df.dtypes.astype(str))).encode())
+    digest.update(repr(list(df.index.names)).encode())
+    return digest.hexdigest()
+
+
+def dataframe_to_excel_bytes(df):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine=EXCEL_ENGINE) as writer:
+        df.to_excel(writer, sheet_name='Sheet1')
+    excel_bytes = output.getvalue()
+    return excel_bytes
+
+
+def _filas(df, inicio, fin, chunk):
+    # Convierte de a bloques, así nunca hay más de `chunk` filas como objetos
+    for desde in range(inicio, fin, chunk):
+        bloque = df.iloc[desde:min(desde + chunk, fin)].astype(object)
+        bloque = bloque.where(bloque.notna(), None)
+        # Los infinitos van como texto, igual que con inf_rep='inf' de to_excel
+        bloque = bloque.replace({np.inf: 'inf', -np.inf: '-inf'})
+        indice = bloque.index.astype(object).where(bloque.index.notna(), None)
+        for etiqueta, fila in zip(indice, bloque.itertuples(index=False, name=None)):
+            yield (etiqueta,) + fila
+
+
+def write_excel_streaming(df, destino, filas_por_hoja=EXCEL_MAX_FILAS, chunk=STREAMING_CHUNK):
+    """Escribe `df` como Excel fila por fila, con memoria constante.
+
+    Con xlsxwriter usa el modo constant_memory y con openpyxl un libro
+    write-only. Si `df` supera `filas_por_hoja`, continúa en Sheet2, Sheet3...
+    """
+    encabezado = [df.index.name] + df.columns.tolist()
+    hojas = range(0, max(len(df), 1), filas_por_hoja)
+
+    if EXCEL_ENGINE == 'xlsxwriter':
+        import xlsxwriter
+
+        libro = xlsxwriter.Workbook(destino, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        })
+        for numero, inicio in enumerate(hojas, start=1):
+            hoja = libro.add_worksheet(f'Sheet{numero}')
+            hoja.write_row(0, 0, encabezado)
+            fin = min(inicio + filas_por_hoja, len(df))
+            for fila, valores in enumerate(_filas(df, inicio, fin, chunk), start=1):
+                hoja.write_row(fila, 0, valores)
+        libro.close()
+    else:
+        from openpyxl import Workbook
+
+        libro = Workbook(write_only=True)
+        for numero, inicio in enumerate(hojas, start=1):
+            hoja = libro.create_sheet(f'Sheet{numero}')
+            hoja.append(encabezado)
+            fin = min(inicio + filas_por_hoja, len(df))
+            for valores in _filas(df, inicio, fin, chunk):
+                hoja.append(valores)
+        libro.save(destino)
+
+
+def export_file(df, formato='xlsx'):
+    """Exporta `df` a un archivo en disco, memorizado por hash de contenido.
+
+    Para tablas grandes: el Excel se escribe en streaming, sin el libro
+    completo en memoria mientras se genera. Devuelve la ruta del archivo.
+    """
+    ruta = os.path.join(EXPORT_DIR, f"{content_hash(df)}.{formato}")
+    if os.path.exists(ruta):
+        cache.touch(ruta)
+        return ruta
+
+    with cache.atomic_path(ruta) as temporal:
+        if formato == 'xlsx':
+            write_excel_streaming(df, temporal)
+        elif formato == 'csv':
+            df.to_csv(temporal, chunksize=STREAMING_CHUNK)
+        else:
+            df.rename(columns=str).to_parquet(temporal)
+
+    prune_exports()
+    return ruta
+
+
+def read_file(ruta):
+    """Bytes de un archivo exportado, cerrando el archivo al terminar.
+
+    st.download_button guarda los bytes en su almacén de medios aunque reciba
+    un archivo abierto, así que se le pasan ya leídos.
+    """
+    with open(ruta, 'rb') as archivo:
+        return archivo.read()
+
+
+def prune_exports():
+    """Conserva en EXPORT_DIR sólo los MAX_EXPORT_FILES archivos usados más recientemente."""
+    cache.prune_dir(EXPORT_DIR, MAX_EXPORT_FILES)
+
+
+def dataframe_to_csv_bytes(df):
+    return df.to_csv().encode('utf-8')
+
+
+def dataframe_to_parquet_bytes(df):
+    # Parquet exige nombres de columna de texto (las tablas pivote usan años)
+    return df.rename(columns=str).to_parquet()
+
+
+_ESCRITORES = {
+    'xlsx': dataframe_to_excel_bytes,
+    'csv': dataframe_to_csv_bytes,
+    'parquet': dataframe_to_parquet_bytes,
+}
+
+
+def export_bytes(df, formato='xlsx'):
+    """Contenido de `df` en `formato`, memorizado por hash de contenido.
+
+    Los archivos menos usados se descartan al superar MAX_CACHE_BYTES.
+    """
+    return _archivos.get_or_build((content_hash(df), formato), lambda: _ESCRITORES[formato](df))
+
+
+def download_buttons(df, label, file_name, formatos=('xlsx', 'csv', 'parquet')):
+    """Botones de descarga de `df`, uno por formato.
+
+    El archivo se genera recién al hacer clic, así los reruns de la página no
+    pagan la serialización. `file_name` va sin extensión.
+    """
+    columnas = st.columns(len(formatos))
+    for columna, formato in zip(columnas, formatos):
+        nombre, mime = FORMATOS[formato]
+        if len(df) >= STREAMING_MIN_FILAS:
+            datos = lambda formato=formato: read_file(export_file(df, formato))
+        else:
+            datos = lambda formato=formato: export_bytes(df, formato)
+        with columna:
+            st.download_button(
+                label=label if formato == 'xlsx' else f"Descargar {nombre}",
+                data=datos,
+                file_name=f"{file_name}.{formato}",
+                mime=mime,
+                key=f"descarga-{file_name}-{formato}",
+                on_click='ignore',
+            )
@@ -0,0 +1,143 @@
+import io
+
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+
+import cache
+import exportar
+
+# Cantidad de imágenes renderizadas que se conservan en memoria
+MAX_IMAGENES = 64
+
+# Mismas opciones con las que st.pyplot guarda las figuras
+OPCIONES_PNG = {'format': 'png', 'dpi': 200, 'bbox_inches': 'tight'}
+
+_imagenes = cache.LRUCache(MAX_IMAGENES)
+
+
+def render(dibujar, df, **parametros):
+    """PNG de `dibujar(fig, df, **parametros)`, memorizado por contenido.
+
+    La figura se crea con matplotlib.figure.Figure, fuera del registro global
+    de pyplot, así las sesiones no comparten estado y la figura se libera al
+    terminar. La clave es el hash de `df` más los parámetros del gráfico.
+    """
+    clave = (dibujar.__name__, exportar.content_hash(df), repr(sorted(parametros.items())))
+    imagen = _imagenes.get(clave)
+    if imagen is not None:
+        return imagen
+
+    fig = Figure()
+    try:
+        dibujar(fig, df, **parametros)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, **OPCIONES_PNG)
+        imagen = buffer.getvalue()
+    finally:
+        fig.clear()
+
+    return _imagenes.put(clave, imagen)
+
+
+def _dibujar_dona(fig, df, etiquetas, valores, titulo):
+    ax = fig.subplots()
+
+    # Crear el gráfico de pastel y mostrar porcentajes
+    ax.pie(
+        df[valores],
+        labels=df[etiquetas],
+        autopct='%1.1f%%',  # Formato de porcentaje con un decimal
+        startangle=140,
+        colors=matplotlib.colormaps['Paired'].colors
+    )
+
+    # Añadir un círculo en el centro para un diseño de donut
+    ax.add_artist(Circle((0, 0), 0.70, fc='white'))
+    ax.set_title(titulo, fontsize=14)
+
+
+def donut_chart(df, etiquetas, valores, titulo):
+    """Gráfico de dona de `valores` por `etiquetas`, con porcentajes."""
+    return render(_dibujar_dona, df, etiquetas=etiquetas, valores=valores, titulo=titulo)
+
+
+def _dibujar_barras_pais(fig, df):
+    ax = fig.subplots()
+
+    # Configurar las posiciones y ancho de las barras
+    bar_width = 0.4
+    index = np.arange(len(df['Pais']))
+
+    bars1 = ax.bar(index - bar_width/2, df['Ejecutados'], bar_width, label='Ejecutados', color='r')
+    bars2 = ax.bar(index + bar_width/2, df['Proyectados'], bar_width, label='Proyectados', color='b')
+
+    # Añadir las etiquetas de los datos en las barras
+    ax.bar_label(bars1, padding=3, fontsize=8, fmt='%.2f')
+    ax.bar_label(bars2, padding=3, fontsize=8, fmt='%.2f')
+
+    # Ajustar las etiquetas y títulos
+    ax.set_xlabel('País')
+    ax.set_ylabel('Monto (en millones)')
+    ax.set_title('Ejecutados y Proyectados por País')
+    ax.set_xticks(index)
+    ax.set_xticklabels(df['Pais'], rotation=45, fontsize=8)
+    ax.set_yticklabels(ax.get_yticks(), fontsize=8)
+    ax.legend()
+
+    fig.subplots_adjust(bottom=0.15)
+    fig.tight_layout()
+
+
+def country_bar_chart(df):
+    """Barras de Ejecutados y Proyectados por 'Pais'."""
+    return render(_dibujar_barras_pais, df)
+
+
+def _dibujar_barras_responsable(fig, df):
+    ax = fig.subplots()
+
+    # Configurar las posiciones y ancho de las barras
+    bar_width = 0.4
+    index = np.arange(len(df['Responsable']))
+
+    bars1 = ax.bar(index - bar_width/2, df['Ejecutados'], bar_width, label='Ejecutados', color='r')
+    bars2 = ax.bar(index + bar_width/2, df['Proyectados'], bar_width, label='Proyectados', color='b')
+
+    # Añadir las etiquetas en las barras, sólo si el valor es mayor a cero
+    for bars in [bars1, bars2]:
+        for bar in bars:
+            yval = bar.get_height()
+            if yval > 0:
+                ax.text(bar.get_x() + bar.get_width()/2, yval + 0.9, round(yval, 1), va='bottom', ha='center', fontsize=5)
+
+    ax.set_xlabel('Responsable')
+    ax.set_ylabel('Monto')
+    ax.set_title('Ejecutados vs Proyectados por Responsable')
+    ax.set_xticks(index)
+    ax.set_xticklabels(df['Responsable'], rotation=90, ha='right', fontsize=6, rotation_mode='anchor')
+    ax.legend()
+
+    fig.subplots_adjust(bottom=0.5)
+    fig.tight_layout()
+
+
+def responsible_bar_chart(df):
+    """Barras de Ejecutados y Proyectados por 'Responsable'."""
+    return render(_dibujar_barras_responsable, df)
+
+
+def _dibujar_regresion(fig, df, x, y, prediccion):
+    fig.set_size_inches(10, 6)
+    ax = fig.subplots()
+    ax.scatter(df[x], df[y], color='blue', label='Datos Reales')
+    ax.plot(df[x], df[prediccion], color='green', label='Línea de Regresión Polinómica')
+    ax.set_xlabel(x)
+    ax.set_ylabel('Porcentaje Acumulado')
+    ax.legend()
+
+
+def regression_chart(df, x, y, prediccion):
+    """Puntos de `y` contra `x` con la curva ajustada `prediccion`."""
+    return render(_dibujar_regresion, df, x=x, y=y, prediccion=prediccion)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+import cache
+
+# Cantidad de juegos de índices que se conservan en memoria
+MAX_INDICES = 8
+
+_indices = cache.LRUCache(MAX_INDICES)
+
+
+class InvertedIndex:
+    """Índice invertido de una columna: valor -> posiciones de fila ordenadas."""
+
+    def __init__(self, serie):
+        codigos, valores = pd.factorize(serie, use_na_sentinel=True)
+        orden = np.argsort(codigos, kind='stable')
+        codigos_ordenados = codigos[orden]
+        cortes = np.flatnonzero(np.diff(codigos_ordenados)) + 1
+        inicio = np.searchsorted(codigos_ordenados, 0)
+        # Los nulos (código -1) no se indexan: ningún filtro los selecciona
+        grupos = np.split(orden[inicio:], cortes[cortes > inicio] - inicio)
+        self.posiciones = dict(zip(valores, grupos)) if len(valores) else {}
+
+    def lookup(self, valores):
+        """Posiciones ordenadas de las filas cuyo valor está en `valores`."""
+        encontradas = [self.posiciones[v] for v in valores if v in self.posiciones]
+        if not encontradas:
+            return np.empty(0, dtype=np.intp)
+        if len(encontradas) == 1:
+            return encontradas[0]
+        return np.sort(np.concatenate(encontradas))
+
+
+def build_indexes(df, columnas):
+    return {columna: InvertedIndex(df[columna]) for columna in columnas}
+
+
+def get_indexes(clave, df, columnas):
+    """Índices de `columnas` para `df`, construidos una vez por `clave`.
+
+    La clave debe identificar el contenido de `df` (p. ej. la versión de datos).
+    """
+    return _indices.get_or_build((clave, tuple(columnas)), lambda: build_indexes(df, columnas))
+
+
+def select(df, indices, **criterios):
+    """Filtra `df` intersectando los índices de cada criterio.
+
+    Cada criterio es columna=valor o columna=[valores]; sólo se materializan
+    las filas del resultado final.
+    """
+    if not criterios:
+        return df
+    listas = []
+    for columna, valores in criterios.items():
+        if not isinstance(valores, (list, tuple, set, np.ndarray)):
+            valores = [valores]
+        listas.append(indices[columna].lookup(valores))
+    listas.sort(key=len)
+    posiciones = listas[0]
+    for otras in listas[1:]:
+        posiciones = np.intersect1d(posiciones, otras, assume_unique=True)
+    return df.iloc[posiciones]
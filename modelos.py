@@ -0,0 +1,469 @@
+import contextlib
+import hashlib
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy import sparse
+from scipy.stats import loguniform, randint
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import GridSearchCV, HalvingRandomSearchCV, ParameterGrid, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVR
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.utils import get_tags
+
+import cache
+import exportar
+import snapshots
+
+try:
+    from skopt import BayesSearchCV
+    from skopt.callbacks import DeadlineStopper
+    from skopt.space import Categorical, Integer, Real
+except ImportError:
+    BayesSearchCV = None
+
+LOGGER = logging.getLogger(__name__)
+
+# Modelos que se comparan, en el orden en que se muestran
+MODELOS = {
+    "Linear Regression": lambda: LinearRegression(),
+    "Decision Tree": lambda: DecisionTreeRegressor(random_state=0),
+    "Random Forest": lambda: RandomForestRegressor(random_state=0),
+    "Support Vector Machine": lambda: SVR(),
+    "Gradient Boosting": lambda: GradientBoostingRegressor(random_state=0),
+}
+
+# Espacio de búsqueda de cada modelo: parámetro -> ('log', mín, máx) para
+# reales en escala logarítmica, ('int', mín, máx) o ('cat', [valores])
+ESPACIOS = {
+    "Linear Regression": {'fit_intercept': ('cat', [True, False])},
+    "Decision Tree": {'max_depth': ('int', 2, 20), 'min_samples_leaf': ('int', 1, 20)},
+    "Random Forest": {'n_estimators': ('int', 50, 300), 'max_depth': ('int', 3, 20), 'min_samples_leaf': ('int', 1, 10)},
+    "Support Vector Machine": {'C': ('log', 0.1, 100.0), 'gamma': ('log', 1e-3, 1.0), 'epsilon': ('log', 0.01, 1.0)},
+    "Gradient Boosting": {'learning_rate': ('log', 0.01, 0.3), 'n_estimators': ('int', 50, 300), 'max_depth': ('int', 2, 5)},
+}
+
+# Métodos de búsqueda disponibles; la bayesiana sólo si scikit-optimize está instalado
+METODOS_BUSQUEDA = ['Successive halving', 'Grid'] + (['Bayesiana'] if BayesSearchCV is not None else [])
+
+# Valores por parámetro en la búsqueda exhaustiva
+PUNTOS_GRILLA = 3
+
+# calamine lee Excel bastante más rápido que openpyxl; si no está instalado
+# se usa openpyxl como hasta ahora
+EXCEL_LECTOR = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+# Archivos de entrenamiento leídos que se conservan en memoria
+MAX_CARGAS = 4
+
+# Archivos subidos ya leídos, como instantáneas Arrow; se conservan en disco
+# los usados más recientemente
+CARGAS_DIR = os.path.join(snapshots.SNAPSHOT_DIR, "cargas")
+MAX_CARGAS_DISCO = 16
+
+# Filas que se predicen por vez en el modo por lotes
+PREDICCION_CHUNK = 10000
+
+# Particiones preprocesadas que se conservan en memoria
+MAX_PREPROCESADOS = 4
+
+# Registro de modelos entrenados, junto a las instantáneas
+REGISTRO_DIR = os.path.join(snapshots.SNAPSHOT_DIR, "modelos")
+MAX_MODELOS = 32
+
+_lock = threading.Lock()
+_executor = None
+_cargas = cache.LRUCache(MAX_CARGAS)
+_preprocesados = cache.LRUCache(MAX_PREPROCESADOS)
+
+
+def _pool():
+    # Un solo pool por proceso, reutilizado entre ejecuciones de la página.
+    # 'spawn' evita copiar con fork el estado de los hilos del servidor
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=min(len(MODELOS), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _descartar_pool():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def read_upload(contenido, columnas, formato='xlsx', instantanea='entrenamiento'):
+    """Lee sólo `columnas` de un Excel o CSV subido, una vez por contenido.
+
+    La clave es el hash de los bytes del archivo. Lo leído queda en memoria
+    para las próximas ejecuciones y como instantánea Arrow `instantanea` en
+    CARGAS_DIR, así al volver a subir un archivo reciente, aun tras un
+    reinicio, no se parsea de nuevo. El DataFrame se comparte entre sesiones:
+    no debe modificarse.
+    """
+    version = (hashlib.sha256(contenido).hexdigest(), formato, *columnas)
+    data = _cargas.get(version)
+    if data is not None:
+        return data
+
+    data = snapshots.load(instantanea, version, CARGAS_DIR)
+    if data is None:
+        inicio = time.perf_counter()
+        if formato == 'csv':
+            data = pd.read_csv(io.BytesIO(contenido), usecols=list(columnas))
+        else:
+            data = pd.read_excel(io.BytesIO(contenido), usecols=list(columnas), engine=EXCEL_LECTOR)
+        LOGGER.info("Archivo %s leído en %.2f s", instantanea, time.perf_counter() - inicio)
+        snapshots.save(instantanea, version, data, CARGAS_DIR, reemplazar=False)
+        cache.prune_dir(CARGAS_DIR, MAX_CARGAS_DISCO)
+
+    return _cargas.put(version, data)
+
+
+def split_and_preprocess(clave, X, Y, preprocesador, test_size=0.2, random_state=0):
+    """Particiona y ajusta `preprocesador` sólo con la parte de entrenamiento.
+
+    El resultado se memoriza por `clave`, que debe identificar los datos, el
+    preprocesador y la partición; en las siguientes ejecuciones no se vuelve a
+    ajustar nada. Devuelve (preprocesador ajustado, (X_train, X_test, Y_train,
+    Y_test)) con las X transformadas, dispersas si el preprocesador lo es.
+    """
+    resultado = _preprocesados.get(clave)
+    if resultado is not None:
+        return resultado
+
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=test_size, random_state=random_state)
+    X_train = preprocesador.fit_transform(X_train)
+    X_test = preprocesador.transform(X_test)
+    resultado = preprocesador, (X_train, X_test, Y_train, Y_test)
+
+    return _preprocesados.put(clave, resultado)
+
+
+def matrix_report(X):
+    """Filas, columnas, densidad y memoria de una matriz, dispersa o no."""
+    filas, columnas = X.shape
+    if sparse.issparse(X):
+        no_nulos = X.nnz
+        memoria = sum(getattr(X, parte).nbytes for parte in ('data', 'indices', 'indptr') if hasattr(X, parte))
+    else:
+        X = np.asarray(X)
+        no_nulos = np.count_nonzero(X)
+        memoria = X.nbytes
+    return {
+        "Filas": filas,
+        "Columnas": columnas,
+        "Densidad": no_nulos / max(filas * columnas, 1),
+        "Dispersa": sparse.issparse(X),
+        "Memoria (MB)": memoria / 1e6,
+        "Densa (MB)": filas * columnas * 8 / 1e6,
+    }
+
+
+def _entrada(modelo, X):
+    # Sólo se densifica para los estimadores que no aceptan matrices dispersas
+    if sparse.issparse(X) and not get_tags(modelo).input_tags.sparse:
+        return X.toarray()
+    return X
+
+
+def build_models(n_jobs=None):
+    """Instancias nuevas de MODELOS; `n_jobs` se aplica a los que lo admiten."""
+    modelos = {}
+    for nombre, crear in MODELOS.items():
+        modelo = crear()
+        if n_jobs is not None and 'n_jobs' in modelo.get_params():
+            modelo.set_params(n_jobs=n_jobs)
+        modelos[nombre] = modelo
+    return modelos
+
+
+def model_key(clave_datos, nombre, modelo):
+    """Clave del registro: datos, modelo e hiperparámetros que definen el ajuste.
+
+    `clave_datos` identifica el conjunto de entrenamiento (p. ej. el hash del
+    archivo, las columnas y la partición). 'n_jobs' no cambia el resultado y
+    no forma parte de la clave.
+    """
+    parametros = {k: v for k, v in modelo.get_params().items() if k != 'n_jobs'}
+    texto = repr((clave_datos, nombre, type(modelo).__name__, sorted(parametros.items()), sklearn.__version__))
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def load_model(clave):
+    """(modelo, resultados) guardados con `clave`, o None si no están."""
+    ruta = os.path.join(REGISTRO_DIR, f"{clave}.joblib")
+    try:
+        guardado = joblib.load(ruta)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        LOGGER.warning("Modelo ilegible en el registro, se descarta: %s", ruta, exc_info=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(ruta)
+        return None
+    # La fecha de modificación marca el último uso para el descarte LRU
+    cache.touch(ruta)
+    return guardado['modelo'], guardado['resultados']
+
+
+def save_model(clave, modelo, resultados):
+    """Guarda el modelo entrenado y sus resultados; descarta los menos usados."""
+    try:
+        with cache.atomic_path(os.path.join(REGISTRO_DIR, f"{clave}.joblib")) as temporal:
+            joblib.dump({'modelo': modelo, 'resultados': resultados}, temporal)
+    except OSError:
+        LOGGER.warning("No se pudo guardar el modelo en %s", REGISTRO_DIR, exc_info=True)
+        return
+
+    # Se conservan sólo los modelos usados más recientemente
+    cache.prune_dir(REGISTRO_DIR, MAX_MODELOS)
+
+
+def fit_and_score(modelo, X_train, X_test, Y_train, Y_test, **kwargs_fit):
+    """Entrena y evalúa un modelo; devuelve (modelo, métricas y tiempos)."""
+    inicio = time.perf_counter()
+    modelo.fit(_entrada(modelo, X_train), Y_train, **kwargs_fit)
+    ajuste = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    Y_pred = modelo.predict(_entrada(modelo, X_test))
+    prediccion = time.perf_counter() - inicio
+
+    return modelo, {
+        "MSE": mean_squared_error(Y_test, Y_pred),
+        "R^2": r2_score(Y_test, Y_pred),
+        "Ajuste (s)": ajuste,
+        "Predicción (s)": prediccion,
+    }
+
+
+def train_and_evaluate(X_train, X_test, Y_train, Y_test, n_jobs=None, clave_datos=None, preprocesador=None):
+    """Entrena todos los modelos a la vez y los entrega a medida que terminan.
+
+    Cada modelo se ajusta en un proceso del pool; los núcleos que sobran se
+    reparten como `n_jobs` entre los modelos que lo admiten. Con
+    `clave_datos`, los modelos ya entrenados con esos datos se cargan del
+    registro y los nuevos se guardan en él. Con `preprocesador` (ya ajustado)
+    se entrega el Pipeline completo en lugar del estimador solo. Genera tuplas
+    (nombre, modelo, resultados). Si el pool no está disponible, los modelos
+    pendientes se entrenan en este proceso.
+    """
+    if n_jobs is None:
+        n_jobs = max((os.cpu_count() or 1) // len(MODELOS), 1)
+    pendientes = build_models(n_jobs)
+    claves = {}
+
+    def terminar(nombre, modelo, resultados):
+        if preprocesador is not None:
+            modelo = Pipeline([('preprocesador', preprocesador), ('modelo', modelo)])
+        resultados = {**resultados, "Registro": False}
+        if clave_datos is not None:
+            save_model(claves[nombre], modelo, resultados)
+        return nombre, modelo, resultados
+
+    if clave_datos is not None:
+        for nombre, modelo in list(pendientes.items()):
+            claves[nombre] = model_key(clave_datos, nombre, modelo)
+            guardado = load_model(claves[nombre])
+            if guardado is not None:
+                del pendientes[nombre]
+                modelo, resultados = guardado
+                yield nombre, modelo, {**resultados, "Registro": True}
+
+    try:
+        if pendientes:
+            executor = _pool()
+            futuros = {
+                executor.submit(fit_and_score, modelo, X_train, X_test, Y_train, Y_test): nombre
+                for nombre, modelo in pendientes.items()
+            }
+            for futuro in as_completed(futuros):
+                nombre = futuros[futuro]
+                modelo, resultados = futuro.result()
+                del pendientes[nombre]
+                yield terminar(nombre, modelo, resultados)
+    except (BrokenProcessPool, OSError):
+        LOGGER.warning("Pool de procesos no disponible; se entrena en serie", exc_info=True)
+        _descartar_pool()
+
+    for nombre, modelo in list(pendientes.items()):
+        yield terminar(nombre, *fit_and_score(modelo, X_train, X_test, Y_train, Y_test))
+
+
+def _distribuciones(espacio, metodo):
+    """Traduce un espacio de ESPACIOS al formato de cada método de búsqueda."""
+    distribuciones = {}
+    for parametro, (tipo, *valores) in espacio.items():
+        if tipo == 'cat':
+            distribucion = Categorical(valores[0]) if metodo == 'Bayesiana' else valores[0]
+        elif metodo == 'Bayesiana':
+            distribucion = Real(*valores, prior='log-uniform') if tipo == 'log' else Integer(*valores)
+        elif metodo == 'Grid':
+            puntos = np.geomspace(*valores, PUNTOS_GRILLA) if tipo == 'log' else np.linspace(*valores, PUNTOS_GRILLA)
+            distribucion = puntos.tolist() if tipo == 'log' else sorted(set(np.round(puntos).astype(int).tolist()))
+        else:
+            distribucion = loguniform(*valores) if tipo == 'log' else randint(valores[0], valores[1] + 1)
+        distribuciones[parametro] = distribucion
+    return distribuciones
+
+
+def build_search(nombre, metodo, candidatos=16, cv=5, n_jobs=-1, segundos=None):
+    """Búsqueda de hiperparámetros de un modelo de MODELOS.
+
+    'Successive halving' prueba `candidatos` configuraciones al azar con
+    pocas muestras y sólo las mejores pasan a la ronda siguiente; 'Grid'
+    recorre PUNTOS_GRILLA valores por parámetro, hasta `candidatos`
+    combinaciones tomadas al azar de la grilla, y 'Bayesiana' hace
+    `candidatos` pruebas guiadas. Los pliegues de validación cruzada se
+    evalúan en paralelo con `n_jobs`. Devuelve (búsqueda, kwargs de fit);
+    con `segundos`, la bayesiana se detiene al agotar ese tiempo.
+    """
+    modelo = MODELOS[nombre]()
+    # El paralelismo va en los pliegues, no dentro de cada modelo
+    if 'n_jobs' in modelo.get_params():
+        modelo.set_params(n_jobs=1)
+    espacio = _distribuciones(ESPACIOS[nombre], metodo)
+    comunes = {'cv': cv, 'scoring': 'neg_mean_squared_error', 'n_jobs': n_jobs}
+
+    if metodo == 'Grid':
+        combinaciones = list(ParameterGrid(espacio))
+        if len(combinaciones) > candidatos:
+            elegidas = np.random.default_rng(0).choice(len(combinaciones), candidatos, replace=False)
+            espacio = [{parametro: [valor] for parametro, valor in combinaciones[i].items()} for i in sorted(elegidas)]
+        return GridSearchCV(modelo, espacio, **comunes), {}
+    if metodo == 'Bayesiana':
+        busqueda = BayesSearchCV(modelo, espacio, n_iter=candidatos, random_state=0, **comunes)
+        return busqueda, {'callback': DeadlineStopper(segundos)} if segundos else {}
+    busqueda = HalvingRandomSearchCV(
+        modelo, espacio, n_candidates=candidatos, factor=3, random_state=0, **comunes,
+    )
+    return busqueda, {}
+
+
+def _datos_busqueda(clave_datos, metodo, presupuesto, candidatos, cv):
+    return clave_datos, 'busqueda', metodo, candidatos, cv, presupuesto
+
+
+def tune_models(X_train, X_test, Y_train, Y_test, metodo, presupuesto=60, candidatos=16, cv=5, n_jobs=-1,
+                clave_datos=None, preprocesador=None):
+    """Busca hiperparámetros para cada modelo en unos `presupuesto` segundos.
+
+    Los modelos se buscan uno tras otro. El presupuesto se controla antes de
+    cada búsqueda y sólo la bayesiana se corta al usar su parte del tiempo
+    restante: 'Grid' y 'Successive halving' terminan la búsqueda en curso,
+    acotada por `candidatos`, así que el total puede excederse. Una vez
+    agotado, los modelos que faltan se entrenan con sus parámetros por
+    defecto. Los resultados se entregan como en
+    `train_and_evaluate`, con los mejores parámetros y el MSE de validación
+    cruzada; las búsquedas completas se guardan en el registro.
+    """
+    inicio = time.perf_counter()
+    nombres = list(MODELOS)
+    for posicion, nombre in enumerate(nombres):
+        clave = None
+        restante = presupuesto - (time.perf_counter() - inicio)
+        if restante <= 0:
+            modelo, resultados = fit_and_score(build_models()[nombre], X_train, X_test, Y_train, Y_test)
+            resultados["Búsqueda"] = "sin presupuesto"
+        else:
+            busqueda, kwargs_fit = build_search(nombre, metodo, candidatos, cv, n_jobs, restante / (len(nombres) - posicion))
+            if clave_datos is not None:
+                clave = model_key(_datos_busqueda(clave_datos, metodo, presupuesto, candidatos, cv), nombre, busqueda.estimator)
+                guardado = load_model(clave)
+                if guardado is not None:
+                    yield nombre, guardado[0], {**guardado[1], "Registro": True}
+                    continue
+
+            modelo, resultados = fit_and_score(busqueda, X_train, X_test, Y_train, Y_test, **kwargs_fit)
+            resultados.update({
+                "CV MSE": -modelo.best_score_,
+                "Candidatos": len(modelo.cv_results_['params']),
+                "Mejores parámetros": repr({
+                    parametro: valor.item() if isinstance(valor, np.generic) else valor
+                    for parametro, valor in modelo.best_params_.items()
+                }),
+                "Búsqueda": metodo,
+            })
+            modelo = modelo.best_estimator_
+
+        if preprocesador is not None:
+            modelo = Pipeline([('preprocesador', preprocesador), ('modelo', modelo)])
+        resultados["Registro"] = False
+        if clave is not None:
+            save_model(clave, modelo, resultados)
+        yield nombre, modelo, resultados
+
+
+def trained_model(clave_datos, nombre, metodo=None, presupuesto=60, candidatos=16, cv=5):
+    """(clave, modelo) del registro entrenado con `clave_datos`, o None.
+
+    Sin `metodo` busca el modelo con parámetros por defecto de
+    `train_and_evaluate`; con él, el de `tune_models` con esos argumentos.
+    """
+    if metodo is not None:
+        clave_datos = _datos_busqueda(clave_datos, metodo, presupuesto, candidatos, cv)
+    clave = model_key(clave_datos, nombre, MODELOS[nombre]())
+    guardado = load_model(clave)
+    return None if guardado is None else (clave, guardado[0])
+
+
+def prediction_file(clave_modelo, contenido):
+    """Ruta del CSV de predicciones de un modelo del registro sobre un archivo subido."""
+    clave = hashlib.sha256(f"{clave_modelo}|{hashlib.sha256(contenido).hexdigest()}".encode()).hexdigest()
+    return os.path.join(exportar.EXPORT_DIR, f"prediccion-{clave[:32]}.csv")
+
+
+def write_predictions(modelo, X, ruta, columna='PorcentajeAcumulado', chunk=PREDICCION_CHUNK):
+    """Escribe `X` con la predicción de `modelo` en el CSV `ruta`, de a `chunk` filas.
+
+    Cada bloque se transforma y predice de forma vectorizada y se agrega al
+    archivo, así mientras se predice nunca hay más de un bloque de resultados
+    en memoria. Genera la cantidad de filas escritas después de cada bloque.
+    Si `ruta` ya existe no se vuelve a predecir.
+    """
+    if os.path.exists(ruta):
+        cache.touch(ruta)
+        yield len(X)
+        return
+
+    with cache.atomic_path(ruta) as temporal, open(temporal, 'w', encoding='utf-8', newline='') as archivo:
+        for inicio in range(0, max(len(X), 1), chunk):
+            bloque = X.iloc[inicio:inicio + chunk]
+            salida = bloque.assign(**{columna: modelo.predict(bloque) if len(bloque) else []})
+            salida.to_csv(archivo, index=False, header=inicio == 0)
+            yield inicio + len(bloque)
+    exportar.prune_exports()
+
+
+def read_predictions(modelo, X, ruta):
+    """Bytes del CSV de predicciones `ruta` para una descarga.
+
+    Las predicciones comparten EXPORT_DIR con las demás exportaciones y pueden
+    descartarse entre que se muestra el botón y el clic; en ese caso se
+    vuelven a escribir antes de leerlas.
+    """
+    for _ in write_predictions(modelo, X, ruta):
+        pass
+    return exportar.read_file(ruta)
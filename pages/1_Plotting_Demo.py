@@ -1,73 +1,27 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import threading
-import io
-import matplotlib.pyplot as plt
 import altair as alt
 
-def dataframe_to_excel_bytes(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Sheet1')
-    excel_bytes = output.getvalue()
-    return excel_bytes
+import cubo
+import desembolsos
+import graficos
+import tabla
 
 LOGGER = st.logger.get_logger(__name__)
-_lock = threading.Lock()
-
-sheet_url_proyectos = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=2084477941&single=true&output=csv"
-sheet_url_operaciones = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=1468153763&single=true&output=csv"
-sheet_url_desembolsos = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=1657640798&single=true&output=csv"
 
 st.title("Análisis de Desembolsos")
 
-def load_data(url):
-    with _lock:
-        return pd.read_csv(url)
-    
-def clean_and_convert_to_float(monto_str):
-    if pd.isna(monto_str):
-        return np.nan
-    try:
-        cleaned_monto = monto_str.replace('.', '').replace(',', '.')
-        return float(cleaned_monto)
-    except ValueError:
-        return np.nan
-
-def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
-    df_operaciones_desembolsos['Monto'] = df_operaciones_desembolsos['Monto'].apply(clean_and_convert_to_float)
-    df_operaciones['AporteFONPLATAVigente'] = df_operaciones['AporteFONPLATAVigente'].apply(clean_and_convert_to_float)
-
-    df_proyectos = df_proyectos[['NoProyecto', 'IDAreaPrioritaria','AreaPrioritaria','IDAreaIntervencion','AreaIntervencion']]
-    df_operaciones = df_operaciones[['NoProyecto', 'NoOperacion', 'IDEtapa', 'Alias', 'Pais', 'FechaVigencia', 'Estado', 'AporteFONPLATAVigente']]
-    df_operaciones_desembolsos = df_operaciones_desembolsos[['IDDesembolso', 'IDOperacion', 'Monto', 'FechaEfectiva']]
-
-    merged_df = pd.merge(df_operaciones_desembolsos, df_operaciones, left_on='IDOperacion', right_on='IDEtapa', how='left')
-    merged_df = pd.merge(merged_df, df_proyectos, on='NoProyecto', how='left')
-
-    merged_df['FechaEfectiva'] = pd.to_datetime(merged_df['FechaEfectiva'], dayfirst=True, errors='coerce')
-    merged_df['FechaVigencia'] = pd.to_datetime(merged_df['FechaVigencia'], dayfirst=True, errors='coerce')
-    merged_df['Ano'] = ((merged_df['FechaEfectiva'] - merged_df['FechaVigencia']).dt.days / 366).fillna(-1)
-    merged_df['Ano'] = merged_df['Ano'].astype(int)
-    
-    merged_df['Monto'] = pd.to_numeric(merged_df['Monto'], errors='coerce')
-    merged_df['AporteFONPLATAVigente'] = pd.to_numeric(merged_df['AporteFONPLATAVigente'], errors='coerce')
-    
-    merged_df['Porcentaje'] = ((merged_df['Monto'] / merged_df['AporteFONPLATAVigente']) * 100).round(2)
-    merged_df['Monto'] = (merged_df['Monto']/1000000).round(3)
-    st.write(merged_df)
-
-    merged_df['FechaEfectiva'] = pd.to_datetime(merged_df['FechaEfectiva'])
-    merged_df['Año'] = merged_df['FechaEfectiva'].dt.year
-    merged_df['Mes'] = merged_df['FechaEfectiva'].dt.month
+def process_data(merged_df, cubo_df, version):
+    # Tabla paginada: sólo la página visible viaja al navegador
+    tabla.paginated_table(merged_df, ('millones', version), key='tabla-desembolsos-analisis')
 
     # Lista de nombres de meses con opción 'Todos los Meses'
     nombres_meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
     nombres_meses_con_todos = ['Todos los Meses'] + nombres_meses
 
     # Lista de países con opción 'Todos'
-    paises_unicos = list(np.sort(merged_df['Pais'].unique()))
+    paises_unicos = sorted(cubo_df['Pais'].dropna().unique())
     paises_con_todos = ['Todos'] + paises_unicos
 
     # Multiselect para elegir países
@@ -81,8 +35,9 @@ def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
     if 'Todos' in selected_countries:
         selected_countries = paises_unicos
 
-    # Lógica de filtrado en función de los países seleccionados
-    df_filtrado = merged_df[merged_df['Pais'].isin(selected_countries)]
+    # Lógica de filtrado en función de los países seleccionados. Los filtros
+    # se aplican sobre las celdas del cubo agregado, no sobre los desembolsos
+    df_filtrado = cubo_df[cubo_df['Pais'].isin(selected_countries)]
     # Select box para elegir año
     año_seleccionado = st.selectbox(
         'Selecciona un año', 
@@ -108,7 +63,7 @@ def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
     # Select box para elegir sector
     Sector_seleccionado = st.selectbox(
         'Selecciona un Sector', 
-        options=['Todos'] + list(np.sort(df_filtrado['IDAreaPrioritaria'].unique())),
+        options=['Todos'] + sorted(df_filtrado['IDAreaPrioritaria'].dropna().unique()),
         index=0
     )
 
@@ -116,10 +71,7 @@ def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
     df_filtrado = df_filtrado if Sector_seleccionado == 'Todos' else df_filtrado[df_filtrado['IDAreaPrioritaria'] == Sector_seleccionado]
 
 
-    resumen_df = df_filtrado.groupby('IDAreaPrioritaria').agg(
-        Proyectos=('IDEtapa', 'nunique'),
-        Suma_Monto=('Monto', 'sum')
-    ).reset_index()
+    resumen_df = cubo.roll_up(df_filtrado, 'IDAreaPrioritaria', 'Proyectos')
 
     total_proyectos = resumen_df['Proyectos'].sum()
     total_suma_monto = resumen_df['Suma_Monto'].sum()
@@ -127,33 +79,15 @@ def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
     resumen_df = pd.concat([resumen_df, total_resumen_df], ignore_index=True)
     st.write(resumen_df)
 
-    # Creando el gráfico circular con mejoras
+    # Creando el gráfico circular con mejoras; la imagen se reutiliza
+    # mientras no cambien los datos filtrados
     df_pie = resumen_df[resumen_df['IDAreaPrioritaria'] != 'Total']
-    fig, ax = plt.subplots()
-
-    # Crear el gráfico de pastel y mostrar porcentajes
-    pie, _, autopcts = ax.pie(
-        df_pie['Suma_Monto'], 
-        labels=df_pie['IDAreaPrioritaria'], 
-        autopct='%1.1f%%',  # Formato de porcentaje con un decimal
-        startangle=140,
-        colors=plt.cm.Paired.colors
-    )
-
-    # Añadir un círculo en el centro para un diseño de donut
-    centre_circle = plt.Circle((0,0),0.70,fc='white')
-    fig.gca().add_artist(centre_circle)
-
-    # Establecer un título para el gráfico
-    ax.set_title('Distribución de Montos por Sector en Porcentajes', fontsize=14)
+    dona = graficos.donut_chart(df_pie, 'IDAreaPrioritaria', 'Suma_Monto', 'Distribución de Montos por Sector en Porcentajes')
 
     # Mostrar el gráfico en Streamlit
-    st.pyplot(fig)
+    st.image(dona, width="stretch")
     
-    resumen_intervencion_total_df = df_filtrado.groupby('IDAreaIntervencion').agg(
-        Proyectos_Unicos=('IDEtapa', 'nunique'),
-        Suma_Monto=('Monto', 'sum')
-    ).reset_index()
+    resumen_intervencion_total_df = cubo.roll_up(df_filtrado, 'IDAreaIntervencion', 'Proyectos_Unicos')
 
     total_proyectos_unicos = resumen_intervencion_total_df['Proyectos_Unicos'].sum()
     total_suma_monto_intervencion = resumen_intervencion_total_df['Suma_Monto'].sum()
@@ -194,12 +128,11 @@ def process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos):
     return df_filtrado
 
 def run():
-    # Cargar y procesar los datos
-    df_proyectos = load_data(sheet_url_proyectos)
-    df_operaciones = load_data(sheet_url_operaciones)
-    df_operaciones_desembolsos = load_data(sheet_url_desembolsos)
+    # Tabla de hechos compartida, con 'Monto' en millones
+    version, merged_df = desembolsos.get_view('millones')
+    cubo_df = cubo.get_cube(version, merged_df, 'millones')
 
-    processed_data = process_data(df_proyectos, df_operaciones, df_operaciones_desembolsos)
+    processed_data = process_data(merged_df, cubo_df, version)
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
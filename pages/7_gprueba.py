@@ -1,35 +1,22 @@
 import streamlit as st
 import altair as alt
-import pandas as pd
+import numpy as np
 
-def calcular_porcentaje_todos(año):
-    return 0.0183 * año**4 - 0.0281 * año**3 - 3.8759 * año**2 + 33.508 * año + 18.887
+import curvas
 
-# Funciones que calculan el PorcentajeAcumulado para cada sector
-def calcular_porcentaje_inf(año):
-    return 0.0065 * año**4 + 0.286 * año**3 - 6.5063 * año**2 + 40.386 * año + 19.582
+# Coeficientes del PorcentajeAcumulado de cada sector, ajustados una vez por
+# versión de datos y guardados en el almacén de curvas con su R²
+ajustes = curvas.sector_fits()
+coeficientes = curvas.sector_curves(ajustes)
 
-def calcular_porcentaje_soc(año):
-    return 0.0787 * año**4 - 1.2018 * año**3 + 3.7085 * año**2 + 16.575 * año + 22.619
-
-def calcular_porcentaje_pro(año):
-    return 0.1935 * año**3 - 4.3676 * año**2 + 33.192 * año + 13.825
-
-# Genera los datos para los gráficos
+# Genera los datos para los gráficos: los tres sectores del año 0 al 8 en una
+# sola evaluación
 def generar_datos():
-    años = range(9)  # Del año 0 al 8
-    datos = {'Año': [], 'PorcentajeAcumulado': [], 'Sector': []}
-    
-    for año in años:
-        datos['Año'].extend([año]*3)
-        datos['PorcentajeAcumulado'].extend([
-            calcular_porcentaje_inf(año),
-            calcular_porcentaje_soc(año),
-            calcular_porcentaje_pro(año)
-        ])
-        datos['Sector'].extend(['INF', 'SOC', 'PRO'])
-    
-    return pd.DataFrame(datos)
+    años = np.repeat(np.arange(9), 3)
+    sectores = np.tile(['INF', 'SOC', 'PRO'], 9)
+    datos = curvas.forecast(sectores, años, coeficientes)
+    datos['Año'] = años
+    return datos[['Año', 'PorcentajeAcumulado', 'Sector']]
 
 # Crea el gráfico de líneas con Altair
 def crear_grafico(dataframe):
@@ -46,18 +33,10 @@ def crear_grafico(dataframe):
 
 # Genera los datos para el DataFrame
 def generar_datos_df():
-    años = range(9)  # Del año 0 al 9
-    datos_inf = [calcular_porcentaje_inf(año) for año in años]
-    datos_soc = [calcular_porcentaje_soc(año) for año in años]
-    datos_pro = [calcular_porcentaje_pro(año) for año in años]
-    
-    df = pd.DataFrame({
-        'Año': años,
-        'INF': datos_inf,
-        'SOC': datos_soc,
-        'PRO': datos_pro
-    })
-    
+    df = generar_datos().pivot(index='Año', columns='Sector', values='PorcentajeAcumulado')
+    df = df[['INF', 'SOC', 'PRO']].reset_index()
+    df.columns.name = None
+
     df = df.round(1)
 
     return df
@@ -82,20 +61,11 @@ año_usuario = st.number_input('Introduce el Año para calcular el Porcentaje Ac
 
 # Botón para realizar el cálculo
 if st.button('Calcular Porcentaje Acumulado'):
-    resultado = None
     # Cálculo del resultado según el sector seleccionado
-    if sector == 'INF':
-        resultado = calcular_porcentaje_inf(año_usuario)
-    elif sector == 'SOC':
-        resultado = calcular_porcentaje_soc(año_usuario)
-    elif sector == 'PRO':
-        resultado = calcular_porcentaje_pro(año_usuario)
-    elif sector == 'Todos':
-        resultado = calcular_porcentaje_todos(año_usuario)
+    resultado = curvas.forecast([sector], [año_usuario], coeficientes)['PorcentajeAcumulado'].iloc[0]
     
     # Mostrar resultado
-    if resultado is not None:
-        st.write(f'El Porcentaje Acumulado pronosticado para el sector {sector} en el año {año_usuario} es: {resultado:.2f}%')
+    st.write(f'El Porcentaje Acumulado pronosticado para el sector {sector} en el año {año_usuario} es: {resultado:.2f}%')
 
 # Crea el gráfico de líneas con Altair
 grafico = crear_grafico(datos_grafico)
@@ -107,3 +77,14 @@ st.altair_chart(grafico, use_container_width=True)
 st.write(f"Tendencia de Desembolso en Porcentaje Acumulado por Año y Sector: {sector}")
 st.dataframe(datos_df)
 
+# Calidad de cada curva: los sectores sin un ajuste plausible usan la curva base
+st.write("Ajuste de las curvas por sector")
+st.dataframe([
+    {
+        'Sector': nombre,
+        'Curva': 'base' if ajuste is None else 'ajustada',
+        'R²': None if ajuste is None else round(ajuste['r2'], 3),
+        'Puntos': None if ajuste is None else ajuste['puntos'],
+    }
+    for nombre, ajuste in ajustes.items()
+])
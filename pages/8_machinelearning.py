@@ -1,60 +1,54 @@
+import hashlib
+import os
+
 import streamlit as st
 import pandas as pd
-from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
-from sklearn.linear_model import LinearRegression
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.svm import SVR
-from sklearn.metrics import mean_squared_error, r2_score
-import skopt
-from skopt import BayesSearchCV
-from sklearn.ensemble import GradientBoostingRegressor
-
-# Función para cargar datos
-@st.cache
+
+import modelos
+
+# Variables del modelo
+FEATURES = ['Año', 'País', 'AreaPrioritaria', 'AreaIntervencion']
+CATEGORICAL_FEATURES = ['País', 'AreaPrioritaria', 'AreaIntervencion']
+TARGET = 'PorcentajeAcumulado'
+TEST_SIZE = 0.2
+RANDOM_STATE = 0
+
+# Función para cargar datos: sólo las columnas del modelo, leídas una vez por
+# contenido del archivo
 def load_data(uploaded_file):
-    data = pd.read_excel(uploaded_file)
-    return data
-
-# Función para preprocesar datos
-def preprocess_data(data):
-    X = data[['Año', 'País', 'AreaPrioritaria', 'AreaIntervencion']]
-    Y = data['PorcentajeAcumulado']
-    categorical_features = ['País', 'AreaPrioritaria', 'AreaIntervencion']
+    return modelos.read_upload(uploaded_file.getvalue(), FEATURES + [TARGET])
+
+# Cartera de operaciones a predecir, en Excel o CSV
+def load_portfolio(uploaded_file):
+    formato = 'csv' if uploaded_file.name.lower().endswith('.csv') else 'xlsx'
+    return modelos.read_upload(uploaded_file.getvalue(), FEATURES, formato=formato, instantanea='cartera')[FEATURES]
+
+# Preprocesador de las variables: one-hot disperso para las categóricas y el
+# año sin cambios. Con sparse_threshold=1.0 la salida queda siempre dispersa
+def build_preprocessor():
     categorical_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=True))
     ])
-    preprocessor = ColumnTransformer(
+    return ColumnTransformer(
         transformers=[
-            ('cat', categorical_transformer, categorical_features)
+            ('cat', categorical_transformer, CATEGORICAL_FEATURES)
         ],
-        remainder='passthrough'
+        remainder='passthrough',
+        sparse_threshold=1.0
+    )
+
+# Función para preprocesar datos: se particiona antes de ajustar, así el
+# preprocesador sólo ve los datos de entrenamiento, y el ajuste se memoriza
+def preprocess_data(data, clave_datos):
+    return modelos.split_and_preprocess(
+        clave_datos, data[FEATURES], data[TARGET], build_preprocessor(),
+        test_size=TEST_SIZE, random_state=RANDOM_STATE,
     )
-    X_processed = preprocessor.fit_transform(X)
-    return train_test_split(X_processed, Y, test_size=0.2, random_state=0)
-
-# Función para entrenar y evaluar modelos
-def train_and_evaluate(X_train, X_test, Y_train, Y_test):
-    models = {
-        "Linear Regression": LinearRegression(),
-        "Decision Tree": DecisionTreeRegressor(random_state=0),
-        "Random Forest": RandomForestRegressor(random_state=0),
-        "Support Vector Machine": SVR(),
-        "Gradient Boosting": GradientBoostingRegressor(random_state=0)
-    }
-    results = {}
-    for name, model in models.items():
-        model.fit(X_train, Y_train)
-        Y_pred = model.predict(X_test)
-        mse = mean_squared_error(Y_test, Y_pred)
-        r2 = r2_score(Y_test, Y_pred)
-        results[name] = {"MSE": mse, "R^2": r2}
-    return results
 
 # Inicio de la aplicación Streamlit
 st.title('Análisis y Modelado de Datos')
@@ -65,10 +59,84 @@ if uploaded_file is not None:
     data = load_data(uploaded_file)
     st.write(data.head())
 
+    # Los datos preprocesados y los modelos entrenados con este mismo archivo,
+    # preprocesamiento y partición se reutilizan en lugar de recalcularse
+    clave_datos = (
+        hashlib.sha256(uploaded_file.getvalue()).hexdigest(),
+        tuple(FEATURES), TARGET, repr(build_preprocessor()), TEST_SIZE, RANDOM_STATE,
+    )
+
     # Preprocesamiento de datos
-    X_train, X_test, Y_train, Y_test = preprocess_data(data)
+    preprocessor, (X_train, X_test, Y_train, Y_test) = preprocess_data(data, clave_datos)
+    st.write("Matrices de entrenamiento y prueba")
+    st.dataframe(pd.DataFrame({'Entrenamiento': modelos.matrix_report(X_train), 'Prueba': modelos.matrix_report(X_test)}).T.infer_objects())
+
+    # Búsqueda de hiperparámetros opcional, acotada en tiempo y candidatos
+    buscar = st.checkbox('Buscar hiperparámetros')
+    if buscar:
+        columnas = st.columns(3)
+        with columnas[0]:
+            metodo = st.selectbox('Método de búsqueda', modelos.METODOS_BUSQUEDA)
+        with columnas[1]:
+            presupuesto = st.number_input(
+                'Presupuesto aproximado (s)', min_value=10, max_value=1800, value=120, step=10,
+                help="Se controla entre modelos: sólo la búsqueda bayesiana se corta a mitad de camino, "
+                     "las demás terminan la búsqueda en curso y pueden excederlo.",
+            )
+        with columnas[2]:
+            candidatos = st.number_input('Candidatos por modelo', min_value=2, max_value=128, value=16, step=2)
 
     # Entrenamiento y evaluación de modelos
     if st.button('Entrenar Modelos'):
-        results = train_and_evaluate(X_train, X_test, Y_train, Y_test)
-        st.write(results)
+        if buscar:
+            entrenamiento = modelos.tune_models(
+                X_train, X_test, Y_train, Y_test, metodo, presupuesto=presupuesto, candidatos=candidatos,
+                clave_datos=clave_datos, preprocesador=preprocessor,
+            )
+        else:
+            # Los modelos se entrenan en paralelo
+            entrenamiento = modelos.train_and_evaluate(X_train, X_test, Y_train, Y_test, clave_datos=clave_datos, preprocesador=preprocessor)
+
+        # Cada modelo se muestra al terminar
+        progreso = st.progress(0.0)
+        tabla_resultados = st.empty()
+        results = {}
+        for name, model, resultados in entrenamiento:
+            results[name] = resultados
+            progreso.progress(len(results) / len(modelos.MODELOS), text=f"{name} listo")
+            tabla_resultados.dataframe(pd.DataFrame(results).T)
+
+    # Predicción por lotes de una cartera nueva con un modelo ya entrenado
+    st.subheader('Predicción por lotes')
+    nombre_modelo = st.selectbox('Modelo para predecir', list(modelos.MODELOS))
+    cartera_file = st.file_uploader("Carga la cartera a predecir (Año, País, AreaPrioritaria, AreaIntervencion)", type=["xlsx", "csv"], key='cartera')
+    if cartera_file is not None:
+        if buscar:
+            entrenado = modelos.trained_model(clave_datos, nombre_modelo, metodo, presupuesto=presupuesto, candidatos=candidatos)
+        else:
+            entrenado = modelos.trained_model(clave_datos, nombre_modelo)
+        try:
+            cartera = load_portfolio(cartera_file)
+        except ValueError as error:
+            st.error(f"No se pudo leer la cartera: {error}")
+            cartera = None
+
+        if entrenado is None:
+            st.info(f"Entrena los modelos para poder predecir con {nombre_modelo}.")
+        elif cartera is not None:
+            clave_modelo, modelo = entrenado
+            ruta = modelos.prediction_file(clave_modelo, cartera_file.getvalue())
+            if st.button(f'Predecir {len(cartera)} operaciones'):
+                # El archivo se escribe por bloques; sólo se muestra el avance
+                progreso = st.progress(0.0)
+                for filas in modelos.write_predictions(modelo, cartera, ruta):
+                    progreso.progress(filas / max(len(cartera), 1), text=f"{filas} de {len(cartera)} filas")
+            if os.path.exists(ruta):
+                st.dataframe(pd.read_csv(ruta, nrows=20))
+                st.download_button(
+                    label="Descargar predicciones (CSV)",
+                    data=lambda: modelos.read_predictions(modelo, cartera, ruta),
+                    file_name=f"prediccion-{nombre_modelo}.csv",
+                    mime='text/csv',
+                    on_click='ignore',
+                )
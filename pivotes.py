@@ -0,0 +1,48 @@
+import cache
+
+# Medidas que se resumen por etapa y año de ejecución
+MEDIDAS = ['Monto', 'Porcentaje']
+
+# Cantidad de selecciones cuyas tablas se conservan en memoria
+MAX_PIVOTES = 16
+
+_pivotes = cache.LRUCache(MAX_PIVOTES)
+
+
+def build_pivots(df, medidas=MEDIDAS, index='IDEtapa', columns='Ano'):
+    """Tablas pivote de varias medidas con una sola agrupación.
+
+    Cada tabla equivale a pd.pivot_table(..., aggfunc='sum', fill_value=0,
+    observed=True) de su medida, con la columna 'Total' por fila.
+    """
+    sumas = df.groupby([index, columns], observed=True)[medidas].sum()
+    pivotes = {}
+    for medida in medidas:
+        # La copia deja los datos con la misma disposición en memoria que
+        # pivot_table, así 'Total' suma en el mismo orden y redondea igual
+        pivote = sumas[medida].unstack(columns, fill_value=0).copy()
+        pivote['Total'] = pivote.sum(axis=1).round(0)
+        pivotes[medida] = pivote
+    return pivotes
+
+
+def cumulative_long(pivote, var_name='Año', value_name='PorcentajeAcumulado'):
+    """Acumulado por fila de `pivote` en formato largo, sólo los valores > 0."""
+    acumulado = pivote.drop(columns=['Total'], errors='ignore').cumsum(axis=1)
+    largo = acumulado.reset_index().melt(id_vars=pivote.index.name, var_name=var_name, value_name=value_name)
+    return largo[largo[value_name] > 0]
+
+
+def get_pivots(clave, df):
+    """Tablas pivote de `df` y el porcentaje acumulado, calculados una vez por `clave`.
+
+    La clave debe identificar el contenido de `df` (p. ej. la versión de datos
+    y la selección de países). Devuelve un dict medida -> tabla, más
+    'PorcentajeAcumulado' en formato largo.
+    """
+    pivotes = _pivotes.get(clave)
+    if pivotes is None:
+        pivotes = build_pivots(df)
+        pivotes['PorcentajeAcumulado'] = cumulative_long(pivotes['Porcentaje'])
+        pivotes = _pivotes.put(clave, pivotes)
+    return pivotes
@@ -0,0 +1,104 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import curvas
+import desembolsos
+import sheets
+
+LOGGER = logging.getLogger(__name__)
+
+# Años desde la vigencia que cubren las curvas; después el acumulado queda fijo
+HORIZONTE_AÑOS = curvas.HORIZONTE_AÑOS
+
+_lock = threading.Lock()
+_proyecciones = {}
+
+
+def portfolio(df_proyectos, df_operaciones):
+    """Operaciones activas con su sector, leídas con desembolsos.ESQUEMAS.
+
+    Una operación está activa si tiene fecha de vigencia y aporte positivo.
+    Los sectores sin curva propia usan la curva 'Todos'.
+    """
+    operaciones = df_operaciones.merge(df_proyectos[['NoProyecto', 'IDAreaPrioritaria']], on='NoProyecto', how='left')
+    activas = operaciones['FechaVigencia'].notna() & (operaciones['AporteFONPLATAVigente'] > 0)
+    operaciones = operaciones[activas & ~operaciones['IDEtapa'].duplicated()]
+    sector = operaciones['IDAreaPrioritaria'].where(operaciones['IDAreaPrioritaria'].isin(curvas.SECTORES), 'Todos')
+    return pd.DataFrame({
+        'IDEtapa': operaciones['IDEtapa'].to_numpy(),
+        'Pais': operaciones['Pais'].to_numpy(),
+        'Sector': sector.to_numpy(),
+        'FechaVigencia': operaciones['FechaVigencia'].to_numpy(),
+        'AporteFONPLATAVigente': operaciones['AporteFONPLATAVigente'].to_numpy(),
+    })
+
+
+def build_projection(operaciones, coeficientes, horizonte=HORIZONTE_AÑOS):
+    """Matriz operaciones × meses con el desembolso proyectado de cada mes.
+
+    Para cada operación se evalúa la curva de su sector en la edad (años
+    desde la vigencia, contados como en 'Ano') al cierre de cada mes. El
+    acumulado se limita a [0, 100] y a no decrecer, y el monto del mes es la
+    diferencia de acumulados por el aporte. Todas las celdas se calculan con
+    una sola llamada a `curvas.forecast`. Devuelve un DataFrame con índice
+    'IDEtapa' y columnas mensuales (pd.Period).
+    """
+    vigencia = operaciones['FechaVigencia'].to_numpy(dtype='datetime64[D]')
+    if not len(vigencia):
+        return pd.DataFrame(index=pd.Index([], name='IDEtapa'), columns=pd.PeriodIndex([], freq='M'), dtype=float)
+
+    meses = pd.period_range(vigencia.min(), vigencia.max() + np.timedelta64(366 * horizonte, 'D'), freq='M')
+    cierres = (meses + 1).start_time.to_numpy(dtype='datetime64[D]')
+    edades = (cierres[None, :] - vigencia[:, None]).astype(float) / 366
+    vigentes = edades >= 0
+
+    sectores = np.repeat(operaciones['Sector'].to_numpy(dtype=object), len(meses))
+    acumulado = curvas.forecast(sectores, np.clip(edades, 0, horizonte).ravel(), coeficientes)
+    acumulado = acumulado['PorcentajeAcumulado'].to_numpy().reshape(edades.shape)
+    acumulado = np.where(vigentes, np.clip(acumulado, 0, 100), 0)
+    acumulado = np.maximum.accumulate(acumulado, axis=1)
+
+    mensual = np.diff(acumulado, axis=1, prepend=0) / 100
+    mensual *= operaciones['AporteFONPLATAVigente'].to_numpy(dtype=float)[:, None]
+    return pd.DataFrame(mensual, index=pd.Index(operaciones['IDEtapa'], name='IDEtapa'), columns=meses)
+
+
+def get_projection():
+    """Devuelve (versión, matriz de `build_projection`) de toda la cartera.
+
+    Se calcula una vez por versión de datos y se comparte entre sesiones: no
+    debe modificarse.
+    """
+    version = desembolsos.data_version()
+    with _lock:
+        matriz = _proyecciones.get(version)
+    if matriz is not None:
+        return version, matriz
+
+    hojas = sheets.load_sheets({
+        nombre: (desembolsos.FUENTES[nombre], desembolsos.ESQUEMAS[nombre])
+        for nombre in ('proyectos', 'operaciones')
+    })
+    operaciones = portfolio(hojas['proyectos'], hojas['operaciones'])
+    matriz = build_projection(operaciones, curvas.sector_curves())
+    LOGGER.info("Proyección de %d operaciones × %d meses", *matriz.shape)
+    # Si las hojas cambiaron mientras se calculaba, la matriz puede ser de la
+    # versión nueva: no se guarda bajo la anterior
+    actual = desembolsos.data_version()
+    if actual != version:
+        return actual, matriz
+    with _lock:
+        _proyecciones.clear()
+        _proyecciones[version] = matriz
+    return version, matriz
+
+
+def monthly_totals(matriz, year, operaciones=None):
+    """Desembolso proyectado por mes (1-12) de `year`, sumando `operaciones` (o todas)."""
+    columnas = matriz.columns.year == year
+    filas = np.ones(len(matriz), dtype=bool) if operaciones is None else matriz.index.isin(operaciones)
+    totales = matriz.to_numpy()[np.ix_(filas, columnas)].sum(axis=0)
+    return pd.Series(totales, index=matriz.columns[columnas].month, name='Curva')
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.error import HTTPError
+
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# URLs de las hojas de Google Sheets publicadas como CSV
+sheet_url_proyectos = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=2084477941&single=true&output=csv"
+sheet_url_operaciones = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=1468153763&single=true&output=csv"
+sheet_url_desembolsos = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSHedheaRLyqnjwtsRvlBFFOnzhfarkFMoJ04chQbKZCBRZXh_2REE3cmsRC69GwsUK0PoOVv95xptX/pub?gid=1657640798&single=true&output=csv"
+
+url_operaciones = "https://docs.google.com/spreadsheets/d/e/2PACX-1vRFmOu4IjdEt7gLuAqjJTMvcpelmTr_IsL1WRy238YgRPDGLxsW74iMVUhYM2YegUblAKbLemfMxpW8/pub?output=csv"
+url_proyecciones = "https://docs.google.com/spreadsheets/d/e/2PACX-1vRFmOu4IjdEt7gLuAqjJTMvcpelmTr_IsL1WRy238YgRPDGLxsW74iMVUhYM2YegUblAKbLemfMxpW8/pub?gid=81813189&single=true&output=csv"
+url_proyecciones_iniciales = "https://docs.google.com/spreadsheets/d/e/2PACX-1vRFmOu4IjdEt7gLuAqjJTMvcpelmTr_IsL1WRy238YgRPDGLxsW74iMVUhYM2YegUblAKbLemfMxpW8/pub?gid=1798498183&single=true&output=csv"
+
+
+
+class Esquema:
+    """Cómo se lee una hoja: columnas, tipos y formatos, sin inferencia.
+
+    Sólo se leen las columnas declaradas. `tipos` mapea columnas a su dtype,
+    `fechas` a su formato, `numeros` son montos con los separadores
+    `thousands`/`decimal` y `convertidores` mapea columnas a una función que
+    recibe la columna leída como texto. Cada columna se convierte una sola vez.
+    """
+
+    def __init__(self, tipos, fechas=None, numeros=(), convertidores=None, thousands=None, decimal='.'):
+        self.tipos = dict(tipos)
+        self.fechas = dict(fechas or {})
+        self.numeros = list(numeros)
+        self.convertidores = dict(convertidores or {})
+        self.thousands = thousands
+        self.decimal = decimal
+
+    def __repr__(self):
+        return (f"Esquema({self.tipos!r}, fechas={self.fechas!r}, numeros={self.numeros!r}, "
+                f"convertidores={self.convertidores!r}, thousands={self.thousands!r}, decimal={self.decimal!r})")
+
+    @property
+    def columnas(self):
+        return [*self.tipos, *self.fechas, *self.numeros, *self.convertidores]
+
+    def read(self, origen):
+        texto = {columna: str for columna in self.columnas if columna not in self.tipos}
+        df = pd.read_csv(
+            origen, usecols=self.columnas, dtype={**self.tipos, **texto},
+            thousands=self.thousands, decimal=self.decimal,
+        )
+        for columna, formato in self.fechas.items():
+            df[columna] = pd.to_datetime(df[columna], format=formato, errors='coerce')
+        for columna in self.numeros:
+            valores = df[columna]
+            if self.thousands:
+                valores = valores.str.replace(self.thousands, '', regex=False)
+            if self.decimal != '.':
+                valores = valores.str.replace(self.decimal, '.', regex=False)
+            df[columna] = pd.to_numeric(valores, errors='coerce')
+        for columna, convertir in self.convertidores.items():
+            df[columna] = convertir(df[columna])
+        return df
+
+
+# Esquemas de las hojas de seguimiento de proyecciones
+esquema_operaciones = Esquema(
+    {'IDOperacion': str, 'Responsable': str},
+    fechas={'FechaEfectiva': '%d/%m/%Y'},
+    numeros=['Monto'],
+)
+esquema_proyecciones = Esquema(
+    {'IDOperacion': str, 'Responsable': str},
+    fechas={'Fecha': '%d/%m/%Y'},
+    numeros=['Monto'],
+)
+esquema_proyecciones_iniciales = Esquema(
+    {'IDOperacion': str, 'Responsable': str},
+    fechas={'FechaProgramada': '%d/%m/%Y'},
+    numeros=['Monto'],
+)
+
+# Segundos durante los cuales una hoja descargada se sirve desde memoria sin
+# consultar al servidor. Se puede ajustar con la variable de entorno.
+DEFAULT_TTL = float(os.environ.get("DESEMBOLSOS_CACHE_TTL", "300"))
+REQUEST_TIMEOUT = 30
+
+_lock = threading.Lock()
+_entradas = {}
+_parseados = {}
+
+# Duración en segundos de la última carga de cada fuente, por nombre
+ultimos_tiempos = {}
+
+
+class _Entrada:
+    """Contenido descargado de una hoja junto con sus validadores HTTP."""
+
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.contenido = None
+        self.hash = None
+        self.etag = None
+        self.last_modified = None
+        self.verificado = 0.0
+
+
+def _entrada(url):
+    with _lock:
+        entrada = _entradas.get(url)
+        if entrada is None:
+            entrada = _entradas[url] = _Entrada(url)
+        return entrada
+
+
+def _descargar(entrada):
+    request = urllib.request.Request(entrada.url)
+    if entrada.contenido is not None:
+        # Re-descarga condicional: el servidor responde 304 si nada cambió
+        if entrada.etag:
+            request.add_header("If-None-Match", entrada.etag)
+        if entrada.last_modified:
+            request.add_header("If-Modified-Since", entrada.last_modified)
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            contenido = response.read()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+    except HTTPError as error:
+        if error.code == 304 and entrada.contenido is not None:
+            return
+        raise
+
+    entrada.etag = etag
+    entrada.last_modified = last_modified
+    # Si el servidor no envía validadores, el hash del contenido evita
+    # volver a parsear una hoja que no cambió
+    nuevo_hash = hashlib.sha256(contenido).hexdigest()
+    if nuevo_hash != entrada.hash:
+        entrada.contenido = contenido
+        entrada.hash = nuevo_hash
+
+
+def fetch(url, ttl=None):
+    """Devuelve el contenido crudo de la hoja, descargándolo sólo si expiró."""
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    entrada = _entrada(url)
+    with entrada.lock:
+        if entrada.contenido is None or time.monotonic() - entrada.verificado >= ttl:
+            _descargar(entrada)
+            entrada.verificado = time.monotonic()
+        return entrada.contenido, entrada.hash
+
+
+def version(url, ttl=None):
+    """Hash del contenido actual de la hoja; cambia sólo si la hoja cambió."""
+    return fetch(url, ttl)[1]
+
+
+def versions(urls, ttl=None):
+    """Versiones de varias hojas, verificadas en paralelo."""
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        return tuple(executor.map(lambda url: version(url, ttl), urls))
+
+
+def load_sheet(url, ttl=None, esquema=None, **read_csv_kwargs):
+    """Lee una hoja como DataFrame usando la caché compartida del proceso.
+
+    Con `esquema` la hoja se lee con sus columnas y tipos declarados; si no,
+    con los kwargs de read_csv. Devuelve una copia, así las páginas pueden
+    modificarla sin alterar la caché.
+    """
+    contenido, hash_contenido = fetch(url, ttl)
+    clave = (url, hash_contenido, repr(esquema), repr(sorted(read_csv_kwargs.items())))
+    with _lock:
+        df = _parseados.get(clave)
+    if df is None:
+        if esquema is not None:
+            df = esquema.read(io.BytesIO(contenido))
+        else:
+            df = pd.read_csv(io.BytesIO(contenido), **read_csv_kwargs)
+        with _lock:
+            # Sólo se conserva la versión vigente de cada hoja
+            for otra in [c for c in _parseados if c[0] == url and c[1] != hash_contenido]:
+                del _parseados[otra]
+            _parseados[clave] = df
+    return df.copy()
+
+
+def load_sheets(fuentes, ttl=None, max_workers=None):
+    """Carga varias hojas a la vez y las parsea a medida que llegan.
+
+    `fuentes` es un dict nombre -> url, o nombre -> (url, Esquema) o
+    (url, kwargs de read_csv).
+    Devuelve un dict nombre -> DataFrame; el tiempo de cada fuente queda en
+    `ultimos_tiempos`.
+    """
+    def cargar(fuente):
+        url, kwargs = fuente if isinstance(fuente, tuple) else (fuente, {})
+        if isinstance(kwargs, Esquema):
+            kwargs = {'esquema': kwargs}
+        inicio = time.perf_counter()
+        df = load_sheet(url, ttl, **kwargs)
+        return df, time.perf_counter() - inicio
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(fuentes)) as executor:
+        futuros = {executor.submit(cargar, fuente): nombre for nombre, fuente in fuentes.items()}
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            resultados[nombre], segundos = futuro.result()
+            ultimos_tiempos[nombre] = segundos
+            LOGGER.info("Hoja %s cargada en %.3f s", nombre, segundos)
+    return {nombre: resultados[nombre] for nombre in fuentes}
+
+
+def clear_cache():
+    with _lock:
+        _entradas.clear()
+        _parseados.clear()
@@ -0,0 +1,100 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+import cache
+
+LOGGER = logging.getLogger(__name__)
+
+# Carpeta de las instantáneas en disco; se puede cambiar con la variable de entorno
+SNAPSHOT_DIR = os.environ.get(
+    "DESEMBOLSOS_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"),
+)
+
+
+def snapshot_key(version):
+    """Clave corta derivada de los hashes de contenido de las hojas fuente."""
+    return hashlib.sha256("|".join(version).encode()).hexdigest()[:32]
+
+
+def _ruta(nombre, version, directorio=None):
+    return os.path.join(directorio or SNAPSHOT_DIR, f"{nombre}-{snapshot_key(version)}.arrow")
+
+
+def load(nombre, version, directorio=None):
+    """Lee la instantánea de `nombre` para esa versión, o None si no existe.
+
+    `directorio` reemplaza a SNAPSHOT_DIR; la lectura marca el archivo como
+    recién usado para `cache.prune_dir`.
+    """
+    if feather is None:
+        return None
+    ruta = _ruta(nombre, version, directorio)
+    if not os.path.exists(ruta):
+        return None
+    cache.touch(ruta)
+    try:
+        # Arrow IPC sin compresión mapeado en memoria: no se descomprime ni se
+        # copia el archivo a un buffer, pero to_pandas carga la tabla completa
+        return feather.read_table(ruta, memory_map=True).to_pandas()
+    except Exception:
+        LOGGER.warning("Instantánea ilegible, se descarta: %s", ruta, exc_info=True)
+        return None
+
+
+def load_latest(nombre):
+    """Última instantánea guardada de `nombre`, sea cual sea su versión.
+
+    Devuelve (versión, DataFrame) o None.
+    """
+    if feather is None or not os.path.isdir(SNAPSHOT_DIR):
+        return None
+    for archivo in os.listdir(SNAPSHOT_DIR):
+        if archivo.startswith(f"{nombre}-") and archivo.endswith(".arrow"):
+            ruta = os.path.join(SNAPSHOT_DIR, archivo)
+            try:
+                tabla = feather.read_table(ruta, memory_map=True)
+                version = json.loads(tabla.schema.metadata[b"version"])
+                return tuple(version), tabla.to_pandas()
+            except Exception:
+                LOGGER.warning("Instantánea ilegible, se descarta: %s", ruta, exc_info=True)
+    return None
+
+
+def save(nombre, version, df, directorio=None, reemplazar=True):
+    """Guarda `df` como la instantánea vigente de `nombre`, sin compresión
+    para leerla mapeada en memoria, y borra las de versiones anteriores.
+
+    Con `reemplazar=False` las anteriores se conservan y quien llama las
+    descarta (p. ej. con `cache.prune_dir` sobre `directorio`).
+    """
+    if feather is None:
+        return
+    ruta = _ruta(nombre, version, directorio)
+    try:
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        # La versión viaja con la instantánea para las cargas incrementales
+        metadata = dict(tabla.schema.metadata or {})
+        metadata[b"version"] = json.dumps(list(version)).encode()
+        with cache.atomic_path(ruta) as temporal:
+            feather.write_feather(tabla.replace_schema_metadata(metadata), temporal, compression="uncompressed")
+    except Exception:
+        LOGGER.warning("No se pudo guardar la instantánea %s", ruta, exc_info=True)
+        return
+
+    if not reemplazar:
+        return
+    for archivo in os.listdir(os.path.dirname(ruta)):
+        anterior = os.path.join(os.path.dirname(ruta), archivo)
+        if archivo.startswith(f"{nombre}-") and anterior != ruta:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(anterior)
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import cache
+
+FILAS_POR_PAGINA = 50
+
+# Cantidad de órdenes de fila que se conservan en memoria
+MAX_ORDENES = 16
+
+SIN_ORDEN = '(sin orden)'
+TODAS = '(todas)'
+
+_ordenes = cache.LRUCache(MAX_ORDENES)
+
+
+def _orden(clave, df, columna, descendente):
+    """Posiciones de las filas de `df` ordenadas por `columna`, memorizadas por clave."""
+    clave = (clave, columna, descendente)
+    posiciones = _ordenes.get(clave)
+    if posiciones is None:
+        serie = df[columna].reset_index(drop=True)
+        posiciones = serie.sort_values(ascending=not descendente, kind='stable', na_position='last').index.to_numpy()
+        posiciones = _ordenes.put(clave, posiciones)
+    return posiciones
+
+
+def _coincide(serie, texto):
+    # En las categorías se busca sobre los valores distintos, no sobre cada fila
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories.astype(str).str.contains(texto, case=False, regex=False)
+        return np.isin(serie.cat.codes.to_numpy(), np.flatnonzero(categorias))
+    return serie.astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+
+
+def filter_rows(df, texto, columna=None):
+    """Máscara de las filas de `df` que contienen `texto` en `columna` (o en cualquiera)."""
+    columnas = df.columns if columna is None else [columna]
+    mascara = np.zeros(len(df), dtype=bool)
+    for nombre in columnas:
+        mascara |= _coincide(df[nombre], texto)
+    return mascara
+
+
+def paginated_table(df, clave, key, filas_por_pagina=FILAS_POR_PAGINA):
+    """Muestra `df` de a una página, con orden, filtro y paginado en el servidor.
+
+    Al navegador sólo se envían las filas de la página visible. `clave` debe
+    identificar el contenido de `df` (p. ej. la versión de datos) y `key`
+    distingue los widgets de cada tabla.
+    """
+    columnas = st.columns(4)
+    with columnas[0]:
+        orden = st.selectbox('Ordenar por', [SIN_ORDEN] + list(df.columns), key=f"{key}-orden")
+    with columnas[1]:
+        descendente = st.checkbox('Descendente', key=f"{key}-descendente")
+    with columnas[2]:
+        columna_filtro = st.selectbox('Filtrar columna', [TODAS] + list(df.columns), key=f"{key}-columna")
+    with columnas[3]:
+        texto = st.text_input('Contiene', key=f"{key}-texto")
+
+    posiciones = np.arange(len(df)) if orden == SIN_ORDEN else _orden(clave, df, orden, descendente)
+    if texto:
+        mascara = filter_rows(df, texto, None if columna_filtro == TODAS else columna_filtro)
+        posiciones = posiciones[mascara[posiciones]]
+
+    total = len(posiciones)
+    paginas = max(math.ceil(total / filas_por_pagina), 1)
+    pagina = st.number_input(f'Página (de {paginas})', min_value=1, max_value=paginas, value=1, step=1, key=f"{key}-pagina")
+    inicio = (min(pagina, paginas) - 1) * filas_por_pagina
+    fin = min(inicio + filas_por_pagina, total)
+
+    st.dataframe(df.iloc[posiciones[inicio:fin]])
+    st.caption(f"Filas {inicio + 1 if total else 0}–{fin} de {total}")
@@ -0,0 +1,109 @@
+import io
+
+import pandas as pd
+import pytest
+
+import desembolsos
+import snapshots
+
+PROYECTOS = b"""NoProyecto,IDAreaPrioritaria,AreaPrioritaria,IDAreaIntervencion,AreaIntervencion
+P1,INF,Infraestructura,TRA,Transporte
+P2,SOC,Social,EDU,Educacion
+"""
+
+OPERACIONES = b"""NoProyecto,NoOperacion,IDEtapa,Alias,Pais,FechaVigencia,Estado,AporteFONPLATAVigente
+P1,AR001,AR001_1,Ruta,ARGENTINA,01/03/2015,Vigente,"10.000.000,00"
+P2,BO002,BO002_1,Escuelas,BOLIVIA,15/06/2017,Vigente,"5.000.000,00"
+P2,BO002,BO002_2,Escuelas II,BOLIVIA,,Vigente,s/d
+"""
+
+DESEMBOLSOS = b"""IDDesembolso,IDOperacion,Monto,FechaEfectiva
+1,AR001_1,"1.000.000,00",10/05/2015
+2,AR001_1,"2.500.000,50",20/02/2016
+3,BO002_1,"750.000,00",01/09/2017
+4,BO002_2,n/a,
+5,XX999_1,"100,00",01/01/2018
+"""
+
+# Respecto de DESEMBOLSOS: cambia el monto de 2, se borra 3 y se agregan 6 y 7
+DESEMBOLSOS_NUEVOS = b"""IDDesembolso,IDOperacion,Monto,FechaEfectiva
+1,AR001_1,"1.000.000,00",10/05/2015
+2,AR001_1,"2.600.000,00",20/02/2016
+4,BO002_2,n/a,
+5,XX999_1,"100,00",01/01/2018
+6,BO002_1,"300.000,00",05/03/2019
+7,AR001_1,"1.200.000,00",30/11/2019
+"""
+
+
+def _hoja(nombre, contenido):
+    return desembolsos.ESQUEMAS[nombre].read(io.BytesIO(contenido))
+
+
+def _completa(hoja_desembolsos):
+    # Lo que `_construir` guarda al reconstruir todo
+    tabla = desembolsos.build_fact_table(_hoja('proyectos', PROYECTOS), _hoja('operaciones', OPERACIONES), hoja_desembolsos)
+    return desembolsos.compact(tabla), desembolsos.row_hashes(hoja_desembolsos)
+
+
+def _incremental(tabla, hashes, hoja_desembolsos):
+    resultado = desembolsos.update_fact_table(
+        tabla, hashes, _hoja('proyectos', PROYECTOS), _hoja('operaciones', OPERACIONES), hoja_desembolsos,
+    )
+    assert resultado is not None
+    return desembolsos.compact(resultado[0]), resultado[1]
+
+
+def _comparar(obtenida, esperada):
+    # Las categorías pueden quedar en otro orden; los valores deben coincidir
+    pd.testing.assert_frame_equal(obtenida, esperada, check_categorical=False)
+
+
+def test_incremental_matches_full_rebuild():
+    tabla, hashes = _completa(_hoja('desembolsos', DESEMBOLSOS))
+    nueva = _hoja('desembolsos', DESEMBOLSOS_NUEVOS)
+
+    obtenida, hashes_obtenidos = _incremental(tabla, hashes, nueva)
+    esperada, hashes_esperados = _completa(nueva)
+
+    _comparar(obtenida, esperada)
+    pd.testing.assert_frame_equal(hashes_obtenidos, hashes_esperados)
+
+
+def test_incremental_matches_full_rebuild_after_snapshot(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path))
+    tabla, hashes = _completa(_hoja('desembolsos', DESEMBOLSOS))
+    snapshots.save('desembolsos', ('v1',), tabla)
+    snapshots.save('desembolsos_filas', ('v1',), hashes)
+    _, tabla = snapshots.load_latest('desembolsos')
+    _, hashes = snapshots.load_latest('desembolsos_filas')
+    nueva = _hoja('desembolsos', DESEMBOLSOS_NUEVOS)
+
+    obtenida, _ = _incremental(tabla, hashes, nueva)
+    esperada, _ = _completa(nueva)
+
+    _comparar(obtenida, esperada)
+
+
+def test_unchanged_sheet_keeps_the_table():
+    hoja = _hoja('desembolsos', DESEMBOLSOS)
+    tabla, hashes = _completa(hoja)
+
+    obtenida, _ = _incremental(tabla, hashes, hoja)
+
+    _comparar(obtenida, tabla)
+
+
+@pytest.mark.parametrize('anterior, actual', [
+    (DESEMBOLSOS, DESEMBOLSOS_NUEVOS + b'6,AR001_1,"1,00",01/01/2020\n'),
+    (DESEMBOLSOS + b'5,AR001_1,"1,00",01/01/2020\n', DESEMBOLSOS_NUEVOS),
+], ids=['hoja actual', 'instantanea anterior'])
+def test_duplicate_ids_require_full_rebuild(anterior, actual):
+    tabla, hashes = _completa(_hoja('desembolsos', anterior))
+
+    resultado = desembolsos.update_fact_table(
+        tabla, hashes, _hoja('proyectos', PROYECTOS), _hoja('operaciones', OPERACIONES), _hoja('desembolsos', actual),
+    )
+
+    assert resultado is None
@@ -0,0 +1,114 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import sheets
+
+CSV = b"IDOperacion,Monto\nA,1.5\nB,2\n"
+CSV_NUEVO = b"IDOperacion,Monto\nA,1.5\nB,2\nC,3\n"
+
+
+class _Servidor(BaseHTTPRequestHandler):
+    """Sirve las hojas de `archivos` como CSV, con validadores opcionales.
+
+    `archivos` mapea ruta -> {'contenido', 'etag', 'last_modified'}; cada
+    respuesta queda registrada en `respuestas` como (ruta, código).
+    """
+
+    archivos = {}
+    respuestas = []
+
+    def do_GET(self):
+        hoja = self.archivos[self.path]
+        etag, last_modified = hoja.get('etag'), hoja.get('last_modified')
+        if (etag and self.headers.get('If-None-Match') == etag) or (
+                last_modified and self.headers.get('If-Modified-Since') == last_modified):
+            self.respuestas.append((self.path, 304))
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.respuestas.append((self.path, 200))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(hoja['contenido'])))
+        if etag:
+            self.send_header('ETag', etag)
+        if last_modified:
+            self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        self.wfile.write(hoja['contenido'])
+
+    def log_message(self, *args):
+        pass
+
+
+class _EsquemaContado(sheets.Esquema):
+    """Esquema que cuenta cuántas veces se parsea la hoja."""
+
+    lecturas = 0
+
+    def read(self, origen):
+        type(self).lecturas += 1
+        return super().read(origen)
+
+
+@pytest.fixture
+def servidor():
+    _Servidor.archivos = {}
+    _Servidor.respuestas = []
+    http = ThreadingHTTPServer(('127.0.0.1', 0), _Servidor)
+    hilo = threading.Thread(target=http.serve_forever, daemon=True)
+    hilo.start()
+    sheets.clear_cache()
+    yield f"http://127.0.0.1:{http.server_port}"
+    http.shutdown()
+    http.server_close()
+    sheets.clear_cache()
+
+
+def test_ttl_serves_from_memory_until_expiry(servidor):
+    _Servidor.archivos['/hoja.csv'] = {'contenido': CSV}
+    url = servidor + '/hoja.csv'
+
+    assert sheets.fetch(url, ttl=60)[0] == CSV
+    assert sheets.fetch(url, ttl=60)[0] == CSV
+    assert len(_Servidor.respuestas) == 1
+
+    time.sleep(0.2)
+    _Servidor.archivos['/hoja.csv'] = {'contenido': CSV_NUEVO}
+    assert sheets.fetch(url, ttl=0.1)[0] == CSV_NUEVO
+    assert len(_Servidor.respuestas) == 2
+
+
+@pytest.mark.parametrize('validador', [{'etag': '"v1"'}, {'last_modified': 'Wed, 01 Jan 2025 00:00:00 GMT'}])
+def test_revalidation_with_304_keeps_content(servidor, validador):
+    _Servidor.archivos['/hoja.csv'] = {'contenido': CSV, **validador}
+    url = servidor + '/hoja.csv'
+
+    _, version = sheets.fetch(url, ttl=0)
+    contenido, version_revalidada = sheets.fetch(url, ttl=0)
+
+    assert _Servidor.respuestas == [('/hoja.csv', 200), ('/hoja.csv', 304)]
+    assert contenido == CSV
+    assert version_revalidada == version
+
+
+def test_unchanged_content_is_not_parsed_again(servidor):
+    # Sin validadores el servidor responde siempre 200; el hash evita el parseo
+    _Servidor.archivos['/hoja.csv'] = {'contenido': CSV}
+    url = servidor + '/hoja.csv'
+    esquema = _EsquemaContado({'IDOperacion': str}, numeros=['Monto'])
+    _EsquemaContado.lecturas = 0
+
+    primera = sheets.load_sheet(url, ttl=0, esquema=esquema)
+    segunda = sheets.load_sheet(url, ttl=0, esquema=esquema)
+
+    assert _Servidor.respuestas == [('/hoja.csv', 200), ('/hoja.csv', 200)]
+    assert _EsquemaContado.lecturas == 1
+    assert segunda.equals(primera)
+
+    _Servidor.archivos['/hoja.csv'] = {'contenido': CSV_NUEVO}
+    assert len(sheets.load_sheet(url, ttl=0, esquema=esquema)) == 3
+    assert _EsquemaContado.lecturas == 2